@@ -0,0 +1,265 @@
+"""Fila de alertas da crew de suporte.
+
+Cada notificação do Alertmanager é dividida em grupos por `alertname`/`instance`
+e cada grupo com alertas disparando vira um item da fila (uma execução da
+crew). Grupos resolvidos cancelam o item pendente correspondente.
+
+A fila é limitada e ordenada pela prioridade dos labels (`priority` P1/P2/... e
+`severity`). Uma repetição de um grupo pendente não ocupa outra posição: é
+mesclada ao item, que passa a carregar o payload mais recente. Com a fila cheia,
+um alerta mais prioritário substitui o pendente menos prioritário.
+
+A fila também registra o item em execução: ele passa de pendente a atual no
+mesmo passo, sob o mesmo lock, então um grupo nunca fica fora das duas listas.
+"""
+
+import hashlib
+import json
+import threading
+import time
+
+# Menor valor = mais prioritário
+SEVERITY_PRIORITY = {"critical": 1, "high": 1, "warning": 2, "info": 3}
+DEFAULT_PRIORITY = 4
+
+
+def label_priority(labels):
+    """Prioridade de um conjunto de labels (label `priority` ou `severity`)."""
+    candidates = [DEFAULT_PRIORITY]
+    priority = str(labels.get("priority", "")).upper()
+    if priority.startswith("P") and priority[1:].isdigit():
+        candidates.append(int(priority[1:]))
+    severity = str(labels.get("severity", "")).lower()
+    if severity in SEVERITY_PRIORITY:
+        candidates.append(SEVERITY_PRIORITY[severity])
+    return min(candidates)
+
+
+def alert_priority(payload):
+    """Maior prioridade entre os alertas do payload."""
+    if not isinstance(payload, dict):
+        return DEFAULT_PRIORITY
+
+    labels_list = [payload.get("commonLabels") or {}, payload.get("labels") or {}]
+    for alert in payload.get("alerts") or []:
+        labels_list.append(alert.get("labels") or {})
+    return min(label_priority(labels) for labels in labels_list)
+
+
+def alert_key(payload):
+    """Chave de deduplicação: os fingerprints dos alertas do payload.
+
+    Alertas sem fingerprint usam os labels; payloads que não vêm do
+    Alertmanager usam o próprio conteúdo.
+    """
+    parts = []
+    if isinstance(payload, dict):
+        for alert in payload.get("alerts") or []:
+            fingerprint = alert.get("fingerprint")
+            if not fingerprint:
+                fingerprint = json.dumps(alert.get("labels") or {}, sort_keys=True)
+            parts.append(fingerprint)
+    if not parts:
+        parts.append(json.dumps(payload, sort_keys=True, default=str))
+
+    digest = hashlib.sha1("|".join(sorted(parts)).encode()).hexdigest()
+    return digest[:16]
+
+
+def common_items(dicts):
+    """Pares chave/valor presentes em todos os dicionários."""
+    if not dicts:
+        return {}
+    common = dict(dicts[0])
+    for d in dicts[1:]:
+        common = {k: v for k, v in common.items() if d.get(k) == v}
+    return common
+
+
+def group_key(labels):
+    return f"{labels.get('alertname', '-')}/{labels.get('instance', '-')}"
+
+
+def group_alerts(payload):
+    """Divide uma notificação do Alertmanager em grupos por alertname/instance.
+
+    Retorna uma lista de (chave, payload do grupo, disparando). O payload do
+    grupo mantém o formato do webhook, com apenas os alertas que ainda disparam
+    (ou todos, se o grupo inteiro foi resolvido). Payloads que não vêm do
+    Alertmanager formam um único grupo.
+    """
+    alerts = payload.get("alerts") if isinstance(payload, dict) else None
+    if not alerts:
+        return [(alert_key(payload), payload, True)]
+
+    grouped = {}
+    for alert in alerts:
+        labels = alert.get("labels") or {}
+        grouped.setdefault(group_key(labels), []).append(alert)
+
+    groups = []
+    for key, group in grouped.items():
+        firing = [a for a in group if a.get("status", "firing") != "resolved"]
+        selected = firing or group
+        group_payload = dict(payload)
+        group_payload.update(
+            {
+                "status": "firing" if firing else "resolved",
+                "alerts": selected,
+                "groupLabels": {
+                    k: v
+                    for k, v in (selected[0].get("labels") or {}).items()
+                    if k in ("alertname", "instance")
+                },
+                "commonLabels": common_items([a.get("labels") or {} for a in selected]),
+                "commonAnnotations": common_items(
+                    [a.get("annotations") or {} for a in selected]
+                ),
+            }
+        )
+        groups.append((key, group_payload, bool(firing)))
+    return groups
+
+
+class QueuedAlert:
+    """Item pendente da fila."""
+
+    def __init__(self, key, priority, payload):
+        self.key = key
+        self.priority = priority
+        self.payload = payload
+        self.enqueued_at = time.time()
+        self.updated_at = self.enqueued_at
+        self.occurrences = 1
+
+    def sort_key(self):
+        return (self.priority, self.enqueued_at)
+
+    def to_dict(self, now=None):
+        now = now or time.time()
+        return {
+            "key": self.key,
+            "priority": self.priority,
+            "occurrences": self.occurrences,
+            "enqueued_at": self.enqueued_at,
+            "wait_seconds": round(now - self.enqueued_at, 3),
+        }
+
+
+class AlertQueue:
+    """Fila limitada por prioridade, com deduplicação por chave.
+
+    A fila é pequena (dezenas de itens), então a escolha do próximo item é uma
+    busca linear; isso mantém simples a mescla e a substituição de itens.
+    """
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self._items = {}
+        self._current = None
+        self._cond = threading.Condition()
+        self._counts = {
+            "queued": 0,
+            "coalesced": 0,
+            "dropped": 0,
+            "rejected": 0,
+            "cancelled": 0,
+        }
+        self._dequeued = 0
+        self._last_wait = 0.0
+        self._max_wait = 0.0
+
+    def put(self, key, priority, payload):
+        """Enfileira o alerta.
+
+        Retorna "queued", "coalesced", "in_progress" (o grupo já está em
+        execução) ou "rejected" (fila cheia e o alerta não é mais prioritário
+        que nenhum pendente).
+        """
+        with self._cond:
+            if self._current is not None and self._current.key == key:
+                return "in_progress"
+
+            item = self._items.get(key)
+            if item is not None:
+                item.payload = payload
+                item.priority = min(item.priority, priority)
+                item.updated_at = time.time()
+                item.occurrences += 1
+                self._counts["coalesced"] += 1
+                return "coalesced"
+
+            if len(self._items) >= self.max_size:
+                # O menos prioritário e mais recente é o candidato a sair
+                worst = max(
+                    self._items.values(),
+                    key=lambda i: (i.priority, i.enqueued_at),
+                )
+                if worst.priority <= priority:
+                    self._counts["rejected"] += 1
+                    return "rejected"
+                del self._items[worst.key]
+                self._counts["dropped"] += 1
+
+            self._items[key] = QueuedAlert(key, priority, payload)
+            self._counts["queued"] += 1
+            self._cond.notify()
+            return "queued"
+
+    def cancel(self, key):
+        """Remove o item pendente com a chave. Retorna True se havia um."""
+        with self._cond:
+            if self._items.pop(key, None) is None:
+                return False
+            self._counts["cancelled"] += 1
+            return True
+
+    def is_running(self, key):
+        with self._cond:
+            return self._current is not None and self._current.key == key
+
+    def current(self):
+        """Item em execução, ou None."""
+        with self._cond:
+            return self._current
+
+    def get(self, timeout=None):
+        """Remove o item mais prioritário e o marca como atual.
+
+        Retorna None após o timeout. O chamador deve chamar task_done() ao
+        terminar a execução.
+        """
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._items, timeout=timeout):
+                return None
+
+            item = min(self._items.values(), key=QueuedAlert.sort_key)
+            del self._items[item.key]
+            self._current = item
+            self._dequeued += 1
+            self._last_wait = time.time() - item.enqueued_at
+            self._max_wait = max(self._max_wait, self._last_wait)
+            return item
+
+    def task_done(self):
+        """Encerra a execução do item atual."""
+        with self._cond:
+            self._current = None
+
+    def stats(self):
+        """Profundidade, itens pendentes e tempos de espera."""
+        with self._cond:
+            now = time.time()
+            pending = sorted(self._items.values(), key=QueuedAlert.sort_key)
+            return {
+                "depth": len(pending),
+                "max_size": self.max_size,
+                "oldest_wait_seconds": round(
+                    max((now - i.enqueued_at for i in pending), default=0.0), 3
+                ),
+                "last_wait_seconds": round(self._last_wait, 3),
+                "max_wait_seconds": round(self._max_wait, 3),
+                "dequeued": self._dequeued,
+                **self._counts,
+                "pending": [item.to_dict(now) for item in pending],
+            }
@@ -1,12 +1,20 @@
+import json
 import logging
 import os
 import sys
 import threading
+import time
 
+from alert_queue import AlertQueue, alert_priority, group_alerts
 from crewai import LLM, Agent, Crew, Process, Task
 from crewai.project import CrewBase, agent, crew, llm, task
 from dotenv import load_dotenv
-from flask import Flask, jsonify, request
+from evidence import collect_evidence
+from flask import Flask, Response, jsonify, request
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
+from tools.process_snapshot import ProcessSnapshotTool
+from tools.prometheus_query import PrometheusQueryTool
+from tools.run_cache import run_cache
 from tools.ssh_diagnostic_tool import SSHDiagnosticTool
 from tools.user_service_metrics import UserServiceMetricsTool
 
@@ -27,7 +35,11 @@ logging.getLogger("paramiko").setLevel(logging.WARNING)
 app = Flask(__name__)
 
 crew_lock = threading.Lock()
-crew_running = False
+worker_thread = None
+
+# Alertas recebidos durante uma execução aguardam aqui, por prioridade
+ALERT_QUEUE_MAX_SIZE = int(os.getenv("ALERT_QUEUE_MAX_SIZE", "50"))
+alert_queue = AlertQueue(ALERT_QUEUE_MAX_SIZE)
 
 
 @CrewBase
@@ -58,7 +70,12 @@ class ItSupportCrew:
             config=self.agents_config["level_1_agent"],
             verbose=True,
             llm=self.general_llm(),
-            tools=[UserServiceMetricsTool(), SSHDiagnosticTool()],
+            tools=[
+                UserServiceMetricsTool(),
+                PrometheusQueryTool(),
+                ProcessSnapshotTool(),
+                SSHDiagnosticTool(),
+            ],
             cache=False,
             function_calling_llm="gpt-4o-mini",
         )
@@ -69,7 +86,11 @@ class ItSupportCrew:
             config=self.agents_config["level_2_agent"],
             verbose=True,
             llm=self.general_llm(),
-            tools=[SSHDiagnosticTool()],
+            tools=[
+                PrometheusQueryTool(),
+                ProcessSnapshotTool(),
+                SSHDiagnosticTool(),
+            ],
             cache=False,
             function_calling_llm="gpt-4o-mini",
         )
@@ -82,6 +103,8 @@ class ItSupportCrew:
             llm=self.general_llm(),
             tools=[
                 UserServiceMetricsTool(),
+                PrometheusQueryTool(),
+                ProcessSnapshotTool(),
                 SSHDiagnosticTool(),
             ],
             cache=False,
@@ -211,8 +234,6 @@ class ItSupportCrew:
 
 # Execução síncrona da crew
 def crew_execution(crew_obj, inputs):
-    global crew_running
-
     try:
         logger.info("======= INICIANDO EXECUÇÃO DA CREW =======")
 
@@ -224,71 +245,134 @@ def crew_execution(crew_obj, inputs):
     except Exception as e:
         logger.exception(f"Erro na execução da crew: {e}")
         return None
-    finally:
-        with crew_lock:
-            crew_running = False
 
 
-def process_alert(event_data):
+def process_alert(item):
     """
-    Processa um alerta, iniciando a execução da crew.
-    Esta função assume que o lock já foi adquirido e crew_running já foi definido como True.
+    Executa a crew para um alerta retirado da fila.
+    Roda na thread do worker, uma execução por vez; a fila já o marcou como
+    atual ao retirá-lo.
     """
-    global crew_running
-
     try:
-        logger.info("Iniciando execução da crew para novo alerta")
-        input_dict = {"input": event_data}
-        crew_instance = ItSupportCrew()
-
-        # Executa a crew em uma thread separada para não bloquear a API
-        thread = threading.Thread(
-            target=crew_execution, args=(crew_instance.it_support_crew(), input_dict)
+        logger.info(
+            f"Iniciando execução da crew para o alerta {item.key} "
+            f"(prioridade {item.priority}, aguardou "
+            f"{time.time() - item.enqueued_at:.1f}s)"
         )
-        thread.daemon = True
-        thread.start()
-
+        # Resultados de ferramentas são compartilhados apenas dentro de uma execução
+        run_cache.start_run(item.key)
+        # Dados básicos do incidente são coletados em paralelo antes das tasks
+        # O alerta chega às tasks sempre como JSON, com ou sem evidências
+        evidence = collect_evidence(item.payload)
+        alert_input = json.dumps(
+            item.payload, ensure_ascii=False, indent=2, default=str
+        )
+        if evidence:
+            alert_input = f"{alert_input}\n\n{evidence}"
+        input_dict = {"input": alert_input}
+        crew_instance = ItSupportCrew()
+        crew_execution(crew_instance.it_support_crew(), input_dict)
     except Exception as e:
         logger.exception(f"Erro ao iniciar execução da crew: {e}")
-        with crew_lock:
-            crew_running = False
+    finally:
+        alert_queue.task_done()
+
+
+def alert_worker():
+    """Consome a fila de alertas, executando a crew para um alerta por vez."""
+    while True:
+        process_alert(alert_queue.get())
+
+
+def start_alert_worker():
+    """Inicia a thread do worker (idempotente)."""
+    global worker_thread
+
+    with crew_lock:
+        if worker_thread is None or not worker_thread.is_alive():
+            worker_thread = threading.Thread(
+                target=alert_worker, name="alert-worker", daemon=True
+            )
+            worker_thread.start()
+
+
+def enqueue_group(key, group_payload, firing):
+    """Enfileira ou cancela o trabalho de um grupo de alertas; retorna o status.
+
+    Se o grupo já está em execução, a fila retorna "in_progress": a execução em
+    andamento já investiga o problema.
+    """
+    if not firing:
+        # Problema já resolvido: não há por que investigar
+        if alert_queue.cancel(key):
+            return "cancelled"
+        return "resolved_while_running" if alert_queue.is_running(key) else "ignored"
+
+    return alert_queue.put(key, alert_priority(group_payload), group_payload)
+
+
+def validate_event(event_data):
+    """Retorna a mensagem de erro de um payload inválido, ou None."""
+    if not isinstance(event_data, dict) or not event_data:
+        return "O corpo deve ser um objeto JSON não vazio"
+    alerts = event_data.get("alerts")
+    if alerts is not None and (
+        not isinstance(alerts, list)
+        or not alerts
+        or not all(isinstance(alert, dict) for alert in alerts)
+    ):
+        return "O campo alerts deve ser uma lista não vazia de objetos"
+    return None
 
 
 @app.post("/event")
 def alert_manager_event():
     """
-    Endpoint que recebe um evento (por exemplo, do Alertmanager)
-    e inicia o pipeline de suporte apenas se não houver crew em execução.
+    Endpoint que recebe um evento (por exemplo, do Alertmanager). A notificação é
+    dividida em grupos por alertname/instance: grupos disparando entram na fila
+    (uma execução da crew por grupo) e grupos resolvidos cancelam o item
+    pendente. Com a fila cheia, o alerta só entra se for mais prioritário que
+    algum pendente. Corpos vazios ou que não são JSON retornam 400 sem entrar na
+    fila.
     """
-    global crew_running
-
     try:
-        event_data = request.get_json()
+        event_data = request.get_json(silent=True)
         logger.debug("Dados recebidos no endpoint /event:")
         logger.debug(event_data)
 
-        with crew_lock:
-            if crew_running:
-                # Se a crew já estiver em execução, rejeita o alerta
-                logger.info("Crew já em execução. Novo alerta foi rejeitado.")
-                return (
-                    jsonify(
-                        {
-                            "message": "Alerta rejeitado",
-                            "status": "rejected",
-                        }
-                    ),
-                    429,
-                )
-            else:
-                crew_running = True
-
-        process_alert(event_data)
+        error = validate_event(event_data)
+        if error:
+            logger.warning(f"Evento inválido recebido: {error}")
+            return jsonify({"error": error, "status": "invalid"}), 400
+
+        results = []
+        for key, group_payload, firing in group_alerts(event_data):
+            status = enqueue_group(key, group_payload, firing)
+            logger.info(f"Grupo de alertas {key}: {status}")
+            results.append({"key": key, "status": status})
+        start_alert_worker()
+
+        if results and all(result["status"] == "rejected" for result in results):
+            return (
+                jsonify(
+                    {
+                        "message": "Fila de alertas cheia",
+                        "status": "rejected",
+                        "groups": results,
+                    }
+                ),
+                429,
+            )
+
         return (
             jsonify(
-                {"message": "Processamento do alerta iniciado", "status": "accepted"}
+                {
+                    "message": "Alerta processado",
+                    "status": "accepted",
+                    "groups": results,
+                }
             ),
-            200,
+            202,
         )
 
     except Exception as e:
@@ -298,11 +382,24 @@ def alert_manager_event():
 
 @app.get("/queue")
 def get_queue_status():
-    """Endpoint para verificar o status da equipe de suporte"""
-    with crew_lock:
-        return jsonify({"crew_running": crew_running})
+    """Endpoint para verificar o status da equipe de suporte e da fila de alertas"""
+    current = alert_queue.current()
+    return jsonify(
+        {
+            "crew_running": current is not None,
+            "current": current.to_dict() if current else None,
+            **alert_queue.stats(),
+        }
+    )
+
+
+@app.get("/metrics")
+def metrics():
+    """Métricas das ferramentas (conexões SSH, tempos de execução)"""
+    return Response(generate_latest(), mimetype=CONTENT_TYPE_LATEST)
 
 
 if __name__ == "__main__":
     logger.info("Iniciando servidor IT Support Crew na porta 5002")
+    start_alert_worker()
     app.run(host="0.0.0.0", port=5002, threaded=True)
@@ -0,0 +1,170 @@
+"""Evidence collection before the crew tasks run.
+
+With `Process.sequential`, data collection is interleaved with the LLM
+reasoning, one tool call at a time. This deterministic step runs before the
+kickoff: it collects in parallel the service metrics, Prometheus alerts, the
+top CPU/memory processes, memory and load of the target servers, and the trend
+of the alert expressions. The result is appended to the `{input}` of the
+`l1_triage_alert` task.
+
+The collectors are the agents' own tools, so their results also land in the
+run cache (`tools.run_cache`) for the following tasks.
+"""
+
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from urllib.parse import parse_qs, urlparse
+
+from tools.process_snapshot import ProcessSnapshotTool
+from tools.prometheus_query import PrometheusQueryTool
+from tools.ssh_diagnostic_tool import SSHDiagnosticTool
+from tools.ssh_output import truncate_text
+from tools.ssh_pool import load_servers_config
+from tools.tool_metrics import EVIDENCE_COLLECTION_DURATION, EVIDENCE_ITEMS
+from tools.user_service_metrics import UserServiceMetricsTool
+
+logger = logging.getLogger(__name__)
+
+EVIDENCE_ENABLED = os.getenv("EVIDENCE_ENABLED", "true").lower() == "true"
+# Total collection deadline; whatever does not finish is left out
+EVIDENCE_DEADLINE = float(os.getenv("EVIDENCE_DEADLINE", "20"))
+EVIDENCE_SECTION_MAX_BYTES = 6000
+EVIDENCE_SECTION_MAX_LINES = 80
+# Alert expressions whose trend is queried
+EVIDENCE_MAX_EXPRESSIONS = 3
+EVIDENCE_TREND_MINUTES = 15
+
+# Commands used when the server has no snapshot service
+SSH_FALLBACK_COMMANDS = [
+    "uptime",
+    "free -m",
+    "ps aux --sort=-%cpu | head -10",
+    "ps aux --sort=-%mem | head -10",
+]
+
+_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="evidence")
+
+
+def alert_expressions(payload):
+    """PromQL expressions of the alerts (from the Alertmanager generatorURL)."""
+    expressions = []
+    alerts = payload.get("alerts") if isinstance(payload, dict) else None
+    for alert in alerts or []:
+        query = parse_qs(urlparse(alert.get("generatorURL") or "").query)
+        for expression in query.get("g0.expr", []):
+            expression = expression.strip()
+            if expression and expression not in expressions:
+                expressions.append(expression)
+    return expressions[:EVIDENCE_MAX_EXPRESSIONS]
+
+
+def target_servers(payload, servers):
+    """Servers named in the alert labels, or every configured server."""
+    values = set()
+    alerts = payload.get("alerts") if isinstance(payload, dict) else None
+    for alert in alerts or []:
+        for value in (alert.get("labels") or {}).values():
+            values.add(str(value))
+    targets = [name for name in servers if any(name in value for value in values)]
+    return targets or list(servers)
+
+
+def plan_collection(payload):
+    """List of (title, callable) to run in parallel."""
+    config = load_servers_config() or {}
+    servers = config.get("servers", {})
+
+    metrics_tool = UserServiceMetricsTool()
+    snapshot_tool = ProcessSnapshotTool()
+    ssh_tool = SSHDiagnosticTool()
+    query_tool = PrometheusQueryTool()
+
+    plan = [
+        (
+            "Service health, Prometheus alerts and metrics",
+            lambda: metrics_tool._run(endpoint="all"),
+        )
+    ]
+    for server in target_servers(payload, servers):
+        if servers[server].get("snapshot_port"):
+            plan.append(
+                (
+                    f"Load, memory and top processes by CPU ({server})",
+                    lambda s=server: snapshot_tool._run(server=s, sort="cpu"),
+                )
+            )
+            plan.append(
+                (
+                    f"Top processes by memory ({server})",
+                    lambda s=server: snapshot_tool._run(server=s, sort="rss"),
+                )
+            )
+        else:
+            plan.append(
+                (
+                    f"Load, memory and top processes ({server})",
+                    lambda s=server: ssh_tool._run(s, commands=SSH_FALLBACK_COMMANDS),
+                )
+            )
+    for expression in alert_expressions(payload):
+        plan.append(
+            (
+                f"Trend of the alert expression over {EVIDENCE_TREND_MINUTES} min",
+                lambda e=expression: query_tool._run(e, minutes=EVIDENCE_TREND_MINUTES),
+            )
+        )
+    return plan
+
+
+def _status(result):
+    if isinstance(result, Exception):
+        return "error"
+    if result.startswith(("Error", "Erro")):
+        return "error"
+    return "ok"
+
+
+def collect_evidence(payload, deadline=EVIDENCE_DEADLINE):
+    """Collects the evidence in parallel and returns the text to append to the
+    alert.
+
+    Returns "" when collection is disabled.
+    """
+    if not EVIDENCE_ENABLED:
+        return ""
+
+    start = time.perf_counter()
+    try:
+        plan = plan_collection(payload)
+    except Exception as e:
+        # Without evidence the crew still runs, collecting through its tools
+        logger.exception(f"Error planning the evidence collection: {e}")
+        return ""
+    futures = [(title, _executor.submit(collect)) for title, collect in plan]
+    wait([future for _, future in futures], timeout=deadline)
+
+    sections = []
+    for title, future in futures:
+        if not future.done():
+            status = "timeout"
+            text = f"Not collected within {deadline:g}s"
+        else:
+            result = future.exception() or future.result()
+            status = _status(result)
+            text, _ = truncate_text(
+                str(result), EVIDENCE_SECTION_MAX_BYTES, EVIDENCE_SECTION_MAX_LINES
+            )
+        EVIDENCE_ITEMS.labels(status).inc()
+        sections.append(f"--- {title} ---\n{text.strip()}")
+
+    elapsed = time.perf_counter() - start
+    EVIDENCE_COLLECTION_DURATION.observe(elapsed)
+    logger.info(f"Evidence collected in {elapsed:.1f}s ({len(sections)} items)")
+
+    header = (
+        f"=== Evidence collected automatically when the alert was received "
+        f"({elapsed:.1f}s) ==="
+    )
+    return "\n\n".join([header] + sections)
@@ -0,0 +1,6 @@
+import os
+import sys
+
+# Os módulos da crew importam uns aos outros a partir da raiz do serviço
+# (from tools.X import ...), como no contêiner
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
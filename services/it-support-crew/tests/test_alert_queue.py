@@ -0,0 +1,160 @@
+import itertools
+import threading
+
+import pytest
+
+import alert_queue
+from alert_queue import AlertQueue, alert_priority, group_alerts, label_priority
+
+
+@pytest.fixture(autouse=True)
+def clock(monkeypatch):
+    """Relógio que avança 1s a cada leitura: a ordem de chegada é determinística."""
+    ticks = itertools.count(1000)
+    monkeypatch.setattr(alert_queue.time, "time", lambda: float(next(ticks)))
+
+
+def test_label_priority():
+    assert label_priority({}) == alert_queue.DEFAULT_PRIORITY
+    assert label_priority({"priority": "P2"}) == 2
+    assert label_priority({"priority": "p1", "severity": "info"}) == 1
+    assert label_priority({"severity": "critical"}) == 1
+    assert label_priority({"priority": "urgent", "severity": "warning"}) == 2
+
+
+def test_alert_priority_uses_the_most_urgent_alert():
+    payload = {
+        "commonLabels": {"severity": "info"},
+        "alerts": [{"labels": {"severity": "warning"}}, {"labels": {"priority": "P1"}}],
+    }
+    assert alert_priority(payload) == 1
+    assert alert_priority("não é um dict") == alert_queue.DEFAULT_PRIORITY
+
+
+def test_get_returns_by_priority_then_arrival():
+    queue = AlertQueue(max_size=10)
+    queue.put("a", 3, {"n": "a"})
+    queue.put("b", 1, {"n": "b"})
+    queue.put("c", 3, {"n": "c"})
+    queue.put("d", 1, {"n": "d"})
+
+    order = []
+    for _ in range(4):
+        order.append(queue.get(timeout=0).key)
+        queue.task_done()
+    assert order == ["b", "d", "a", "c"]
+    assert queue.get(timeout=0) is None
+
+
+def test_repeated_key_is_coalesced():
+    queue = AlertQueue(max_size=10)
+    assert queue.put("a", 3, {"v": 1}) == "queued"
+    assert queue.put("a", 2, {"v": 2}) == "coalesced"
+    assert queue.put("a", 4, {"v": 3}) == "coalesced"
+
+    stats = queue.stats()
+    assert stats["depth"] == 1
+    assert stats["pending"][0]["occurrences"] == 3
+    item = queue.get(timeout=0)
+    # Payload mais recente, maior prioridade já vista e posição original
+    assert item.payload == {"v": 3}
+    assert item.priority == 2
+    assert item.enqueued_at < item.updated_at
+
+
+def test_running_key_is_not_queued_again():
+    queue = AlertQueue(max_size=10)
+    queue.put("a", 2, {})
+    item = queue.get(timeout=0)
+    assert queue.current() is item
+    assert queue.is_running("a")
+    assert queue.put("a", 1, {}) == "in_progress"
+    assert queue.stats()["depth"] == 0
+
+    queue.task_done()
+    assert queue.current() is None
+    assert queue.put("a", 1, {}) == "queued"
+
+
+def test_full_queue_evicts_the_least_urgent_newest_item():
+    queue = AlertQueue(max_size=3)
+    queue.put("old-low", 3, {})
+    queue.put("new-low", 3, {})
+    queue.put("high", 1, {})
+
+    assert queue.put("medium", 2, {}) == "queued"
+    pending = [item["key"] for item in queue.stats()["pending"]]
+    assert pending == ["high", "medium", "old-low"]
+    assert queue.stats()["dropped"] == 1
+
+
+def test_full_queue_rejects_alerts_not_more_urgent_than_any_pending():
+    queue = AlertQueue(max_size=2)
+    queue.put("a", 2, {})
+    queue.put("b", 2, {})
+
+    assert queue.put("c", 2, {}) == "rejected"
+    assert queue.put("d", 3, {}) == "rejected"
+    stats = queue.stats()
+    assert stats["rejected"] == 2
+    assert [item["key"] for item in stats["pending"]] == ["a", "b"]
+
+
+def test_cancel_removes_only_pending_items():
+    queue = AlertQueue(max_size=10)
+    queue.put("a", 2, {})
+    queue.put("b", 2, {})
+    queue.get(timeout=0)
+
+    assert not queue.cancel("a")  # já em execução
+    assert queue.cancel("b")
+    assert not queue.cancel("b")
+    stats = queue.stats()
+    assert stats["cancelled"] == 1
+    assert stats["depth"] == 0
+
+
+def test_get_waits_for_a_put():
+    queue = AlertQueue(max_size=10)
+    result = []
+    consumer = threading.Thread(target=lambda: result.append(queue.get(timeout=5)))
+    consumer.start()
+    queue.put("a", 2, {})
+    consumer.join(5)
+    assert result and result[0].key == "a"
+
+
+def test_group_alerts_splits_by_alertname_and_instance():
+    payload = {
+        "receiver": "crew",
+        "alerts": [
+            {
+                "status": "firing",
+                "labels": {"alertname": "HighCPU", "instance": "a", "job": "x"},
+            },
+            {
+                "status": "resolved",
+                "labels": {"alertname": "HighCPU", "instance": "a", "job": "y"},
+            },
+            {"status": "resolved", "labels": {"alertname": "HighCPU", "instance": "b"}},
+        ],
+    }
+    groups = {key: (group, firing) for key, group, firing in group_alerts(payload)}
+
+    assert set(groups) == {"HighCPU/a", "HighCPU/b"}
+    group, firing = groups["HighCPU/a"]
+    assert firing
+    assert group["status"] == "firing"
+    assert group["receiver"] == "crew"
+    assert [a["labels"]["job"] for a in group["alerts"]] == ["x"]
+    assert group["groupLabels"] == {"alertname": "HighCPU", "instance": "a"}
+    group, firing = groups["HighCPU/b"]
+    assert not firing
+    assert group["status"] == "resolved"
+
+
+def test_group_alerts_keeps_other_payloads_whole():
+    [(key, group, firing)] = group_alerts({"message": "disk full"})
+    assert group == {"message": "disk full"}
+    assert firing
+    assert key == alert_queue.alert_key({"message": "disk full"})
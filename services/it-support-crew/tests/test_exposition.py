@@ -0,0 +1,154 @@
+import math
+import re
+
+import pytest
+
+from tools.exposition import (
+    ScrapeHistory,
+    histogram_quantile,
+    parse_label_filter,
+    sample_total,
+    summarize_exposition,
+)
+
+INF = math.inf
+
+
+def exposition(requests=10, errors=2, bucket_counts=(5, 9, 10), connections=3):
+    """Exposition with a counter, a gauge and a histogram (buckets 0.1, 1, +Inf)."""
+    fast, slow, total = bucket_counts
+    return (
+        "# HELP http_requests_total Total HTTP Requests\n"
+        "# TYPE http_requests_total counter\n"
+        f'http_requests_total{{endpoint="/users",status="200"}} {requests}\n'
+        f'http_requests_total{{endpoint="/users",status="500"}} {errors}\n'
+        "# HELP pool_connections Connections in use\n"
+        "# TYPE pool_connections gauge\n"
+        f"pool_connections {connections}\n"
+        "# HELP latency_seconds Latency\n"
+        "# TYPE latency_seconds histogram\n"
+        f'latency_seconds_bucket{{le="0.1"}} {fast}\n'
+        f'latency_seconds_bucket{{le="1.0"}} {slow}\n'
+        f'latency_seconds_bucket{{le="+Inf"}} {total}\n'
+        f"latency_seconds_count {total}\n"
+        f"latency_seconds_sum {total * 0.2}\n"
+    )
+
+
+def rows(table):
+    """{(metric, labels): cells} from the summary table."""
+    result = {}
+    for line in table.splitlines()[1:]:
+        cells = line.split(" | ")
+        result[(cells[0], cells[1])] = cells[2:]
+    return result
+
+
+def test_histogram_quantile_interpolates_within_buckets():
+    buckets = [(0.1, 50), (0.5, 90), (1.0, 100), (INF, 100)]
+    assert histogram_quantile(0.5, buckets) == pytest.approx(0.1)
+    assert histogram_quantile(0.95, buckets) == pytest.approx(0.75)
+    assert histogram_quantile(0.99, buckets) == pytest.approx(0.95)
+    assert histogram_quantile(0.25, buckets) == pytest.approx(0.05)
+
+
+def test_histogram_quantile_edge_cases():
+    assert histogram_quantile(0.5, []) is None
+    assert histogram_quantile(0.5, [(0.1, 0), (INF, 0)]) is None
+    # Above the highest finite bucket the estimate is that bucket's bound
+    assert histogram_quantile(0.9, [(0.1, 10), (INF, 20)]) == 0.1
+    # Empty buckets above the last observation do not move the estimate
+    assert histogram_quantile(1.0, [(0.1, 10), (0.2, 10), (INF, 10)]) == 0.1
+
+
+def test_parse_label_filter():
+    selectors = parse_label_filter("status=500, endpoint=~/users.*")
+    assert selectors["status"] == (False, "500")
+    is_regex, pattern = selectors["endpoint"]
+    assert is_regex and pattern.fullmatch("/users/1")
+    assert parse_label_filter(None) == {}
+    assert parse_label_filter(" , ") == {}
+    with pytest.raises(ValueError):
+        parse_label_filter("status")
+    with pytest.raises(re.error):
+        parse_label_filter("endpoint=~(")
+
+
+def test_first_scrape_has_values_but_no_rates():
+    table, samples = summarize_exposition(exposition(), now=100)
+    summary = rows(table)
+
+    assert summary[("http_requests_total", "endpoint=/users,status=200")][:2] == [
+        "10",
+        "-",
+    ]
+    assert summary[("pool_connections", "-")][0] == "3"
+    # count, rate, avg, p50, p95, p99
+    assert summary[("latency_seconds", "-")] == ["10", "-", "0.2", "0.1", "1", "1"]
+    assert sample_total(samples, "http_requests_total") == 12
+    assert sample_total(samples, "missing") is None
+
+
+def test_second_scrape_reports_rates_and_interval_quantiles():
+    history = ScrapeHistory()
+    _, samples = summarize_exposition(exposition(), now=100)
+    history.update("target", samples, 100)
+
+    # 20 new requests in 10s, all slower than 0.1s
+    table, _ = summarize_exposition(
+        exposition(requests=30, bucket_counts=(5, 29, 30)),
+        previous=history.previous("target"),
+        now=110,
+    )
+    summary = rows(table)
+
+    assert summary[("http_requests_total", "endpoint=/users,status=200")][1] == "2"
+    latency = [
+        line for line in table.splitlines() if line.startswith("latency_seconds")
+    ]
+    assert latency[0].endswith("(since last scrape)")
+    cells = summary[("latency_seconds", "-")]
+    assert cells[:2] == ["30", "2"]
+    assert float(cells[3]) == pytest.approx(0.1 + 0.9 * 10 / 20)
+
+
+def test_counter_reset_has_no_rate():
+    _, samples = summarize_exposition(exposition(requests=50), now=100)
+    previous = {key: (100, value) for key, value in samples.items()}
+
+    table, _ = summarize_exposition(exposition(requests=5), previous=previous, now=110)
+    assert rows(table)[("http_requests_total", "endpoint=/users,status=200")][1] == "-"
+
+
+def test_name_and_label_filters():
+    table, _ = summarize_exposition(
+        exposition(), name_filter="http_requests", label_filter="status=~5.."
+    )
+    assert list(rows(table)) == [("http_requests_total", "endpoint=/users,status=500")]
+
+    table, _ = summarize_exposition(exposition(), name_filter="nothing_matches")
+    assert table == "No metrics matched the filters."
+
+
+def test_rows_beyond_the_limit_are_summarized():
+    text = "# TYPE items gauge\n" + "".join(
+        f'items{{id="{i}"}} {i}\n' for i in range(20)
+    )
+    table, samples = summarize_exposition(text, max_rows=5)
+    lines = table.splitlines()
+
+    # Highest values first, then a line counting the rest
+    assert [line.split(" | ")[2] for line in lines[1:6]] == [
+        "19",
+        "18",
+        "17",
+        "16",
+        "15",
+    ]
+    assert lines[6] == "items | ... 15 more series (use labels to filter)"
+    assert len(samples) == 20
+
+
+def test_malformed_exposition_raises_value_error():
+    with pytest.raises(ValueError):
+        summarize_exposition("this is not an exposition")
@@ -0,0 +1,111 @@
+import pytest
+
+from tools import run_cache as run_cache_module
+from tools.run_cache import (
+    RunCache,
+    command_programs,
+    command_ttl,
+    is_cacheable,
+    is_state_changing,
+)
+
+
+@pytest.mark.parametrize(
+    "command",
+    [
+        "kill -9 123",
+        "/bin/kill 123",
+        "sudo kill 123",
+        "sudo -u root kill 123",
+        "sudo -n -u root -- pkill stress",
+        'bash -c "kill 123"',
+        "sh -c 'rm -rf /tmp/x'",
+        "sh -xc 'ps aux; systemctl restart nginx'",
+        "nice -n 5 kill 1",
+        "ionice -c3 rm /tmp/x",
+        "ionice -c 2 -n 7 rm /tmp/x",
+        "stdbuf -oL kill 1",
+        "timeout -s KILL 5 systemctl restart nginx",
+        "FOO=1 env -i kill 2",
+        "nohup renice 10 -p 1",
+        "ps aux | xargs -n 1 kill",
+        "free -m; rm -f /tmp/a",
+        "uptime && reboot",
+        "echo $(rm /tmp/x)",
+        "echo `pkill x`",
+        "echo a > /tmp/x",
+        "ps aux >> /tmp/x",
+        "sed -i s/a/b/ /etc/hosts",
+        # Cannot be parsed: treated as state-changing
+        "sh -c 'ps aux",
+    ],
+)
+def test_state_changing_commands(command):
+    assert is_state_changing(command)
+    assert not is_cacheable(command)
+
+
+@pytest.mark.parametrize(
+    "command",
+    [
+        "ps aux",
+        "ps aux | grep service",
+        "grep -c kill /var/log/app.log",
+        "ps aux | grep -E -e 'nginx|kill'",
+        "free -m 2>&1",
+        "ps aux 2>/dev/null",
+        "sudo -u root cat /var/log/syslog | tail -n 5",
+        "df -h; du -sh /var/log",
+        "bash -c 'ps aux | head'",
+    ],
+)
+def test_read_only_commands_are_cacheable(command):
+    assert not is_state_changing(command)
+    assert is_cacheable(command)
+
+
+@pytest.mark.parametrize(
+    "command",
+    ["curl localhost:5001/health", "awk '{print $1}' /etc/passwd", "python3 x.py", ""],
+)
+def test_unknown_commands_are_not_cached(command):
+    assert not is_state_changing(command)
+    assert not is_cacheable(command)
+
+
+def test_command_programs():
+    assert command_programs("sudo -u root nice -n 5 ps aux | grep x") == ["ps", "grep"]
+    assert command_programs("sh -c 'free -m && uptime'") == ["free", "uptime"]
+    assert command_programs("timeout 5 /usr/bin/top -b -n 1") == ["top"]
+    assert command_programs("bash script.sh") == ["bash"]
+    assert command_programs("ps aux 2>&1 | tail -n 5 > /dev/null") == ["ps", "tail"]
+
+
+def test_command_ttl_is_the_shortest_of_its_programs():
+    assert command_ttl("df -h") == 60
+    assert command_ttl("ps aux") == 20
+    assert command_ttl("ps aux | grep x") == 10
+    assert command_ttl("uname -a") == run_cache_module.TOOL_CACHE_DEFAULT_TTL
+
+
+def test_run_cache_expiry_invalidation_and_runs(monkeypatch):
+    clock = [100.0]
+    monkeypatch.setattr(run_cache_module.time, "monotonic", lambda: clock[0])
+    cache = RunCache()
+    cache.start_run("r1")
+
+    assert cache.get("tool", "k") is None
+    cache.put("tool", "k", "value", ttl=10)
+    clock[0] += 4
+    assert cache.get("tool", "k") == ("value", 4)
+    clock[0] += 6
+    assert cache.get("tool", "k") is None
+
+    cache.put("tool", "k", "value", ttl=10)
+    cache.invalidate()
+    assert cache.get("tool", "k") is None
+
+    cache.put("tool", "k", "value", ttl=10)
+    cache.start_run("r2")
+    assert cache.run_id == "r2"
+    assert cache.get("tool", "k") is None
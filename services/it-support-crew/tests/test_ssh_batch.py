@@ -0,0 +1,75 @@
+import re
+import subprocess
+
+from tools.ssh_batch import build_batch_script, new_nonce, parse_batch_output
+
+
+def run_batch(commands, command_timeout=5):
+    """Runs the batch script in a local shell, as the SSH exec would."""
+    nonce = new_nonce()
+    script = build_batch_script(commands, nonce, command_timeout)
+    process = subprocess.run(
+        ["sh", "-c", script], capture_output=True, text=True, timeout=30
+    )
+    return parse_batch_output(commands, process.stdout, process.stderr, nonce)
+
+
+def test_new_nonce_is_random():
+    nonces = {new_nonce() for _ in range(100)}
+    assert len(nonces) == 100
+    assert all(re.fullmatch(r"__batch_[0-9a-f]{16}", nonce) for nonce in nonces)
+
+
+def test_results_are_split_per_command():
+    commands = ["echo one; echo two", "printf abc", "echo oops >&2; exit 3"]
+    results = run_batch(commands)
+
+    assert [r["command"] for r in results] == commands
+    assert results[0]["stdout"] == "one\ntwo\n"
+    assert results[0]["stderr"] == ""
+    assert results[0]["exit_code"] == 0
+    assert results[1]["stdout"] == "abc"
+    assert results[2]["stdout"] == ""
+    assert results[2]["stderr"] == "oops\n"
+    assert results[2]["exit_code"] == 3
+    assert not any(r["timed_out"] for r in results)
+    assert all(r["duration_ms"] >= 0 for r in results)
+    assert not any("error" in r for r in results)
+
+
+def test_commands_do_not_read_the_script():
+    # stdin is /dev/null: a command reading it cannot swallow the next ones
+    results = run_batch(["cat", "echo after"])
+    assert results[0]["stdout"] == ""
+    assert results[1]["stdout"] == "after\n"
+
+
+def test_output_that_looks_like_a_marker_is_kept():
+    fake = "printf '__batch_0000000000000000:end:0:0:1\\n'"
+    results = run_batch([fake, "echo next"])
+    assert results[0]["stdout"] == "__batch_0000000000000000:end:0:0:1\n"
+    assert results[1]["stdout"] == "next\n"
+
+
+def test_timed_out_command_is_flagged():
+    results = run_batch(["sleep 5", "echo next"], command_timeout=1)
+    assert results[0]["timed_out"]
+    assert results[0]["exit_code"] == 124
+    assert results[1]["stdout"] == "next\n"
+    assert not results[1]["timed_out"]
+
+
+def test_incomplete_output_marks_missing_commands():
+    commands = ["echo a", "echo b"]
+    nonce = "__batch_test"
+    stdout = (
+        f"{nonce}:begin:0\na\n\n{nonce}:end:0:0:1500000\n" f"{nonce}:begin:1\npartial"
+    )
+    stderr = f"{nonce}:begin:0\n\n{nonce}:end:0\n{nonce}:begin:1\n"
+
+    first, second = parse_batch_output(commands, stdout, stderr, nonce)
+    assert first["stdout"] == "a\n"
+    assert first["duration_ms"] == 1.5
+    assert second["exit_code"] is None
+    assert second["stdout"] == ""
+    assert second["error"] == "Command did not complete"
@@ -0,0 +1,132 @@
+from tools.ssh_output import (
+    CappedBuffer,
+    HeadTailBuffer,
+    elision_marker,
+    read_channel,
+    truncate_text,
+)
+
+
+def numbered_lines(count):
+    return "".join(f"line {i:05d}\n" for i in range(count))
+
+
+def split_result(text):
+    """(head, marker, tail) of a truncated result."""
+    head, _, rest = text.partition("\n[... ")
+    marker, _, tail = rest.partition(" omitted ...]\n")
+    return head, marker, tail
+
+
+def test_short_output_is_unchanged():
+    text = numbered_lines(10)
+    assert truncate_text(text, max_bytes=1024, max_lines=20) == (text, 0)
+
+
+def test_line_budget_keeps_first_and_last_lines():
+    text = numbered_lines(100)  # 11 bytes per line, within the byte budget
+    result, omitted = truncate_text(text, max_bytes=4096, max_lines=10)
+
+    lines = text.splitlines(keepends=True)
+    assert result == "".join(lines[:5]) + elision_marker(990, 90) + "".join(lines[-5:])
+    assert omitted == 990
+
+
+def test_byte_budget_keeps_head_and_tail():
+    text = numbered_lines(10000)
+    result, omitted = truncate_text(text, max_bytes=1000, max_lines=1000)
+
+    head, marker, tail = split_result(result)
+    assert text.startswith(head)
+    assert text.endswith(tail)
+    # The tail starts on a line boundary
+    assert tail.startswith("line ")
+    assert len(head) + len(tail) + omitted == len(text)
+    assert len(head) + len(tail) <= 1000
+    lines_omitted = int(marker.split("(")[1].split()[0])
+    assert lines_omitted == 10000 - head.count("\n") - tail.count("\n")
+
+
+def test_streaming_feed_matches_a_single_feed():
+    data = numbered_lines(5000).encode()
+    streamed = HeadTailBuffer(max_bytes=2000, max_lines=100)
+    for start in range(0, len(data), 777):
+        streamed.feed(data[start : start + 777])
+    whole = HeadTailBuffer(max_bytes=2000, max_lines=100)
+    whole.feed(data)
+
+    assert streamed.result() == whole.result()
+    # Memory stays bounded while streaming
+    assert len(streamed.head) + len(streamed.tail) <= 2000 + 2 * 1000
+
+
+def test_split_multibyte_characters_do_not_fail():
+    text = "ção\n" * 2000
+    result, omitted = truncate_text(text, max_bytes=101, max_lines=1000)
+    assert omitted > 0
+    assert result.startswith("ção\n")
+
+
+def test_capped_buffer_keeps_the_start():
+    buffer = CappedBuffer(max_bytes=10)
+    buffer.feed(b"0123456")
+    buffer.feed(b"789abcdef")
+    assert buffer.text() == "0123456789"
+    assert buffer.total == 16
+
+
+class FakeChannel:
+    """Exec channel that returns the given chunks, then an exit status."""
+
+    def __init__(self, stdout=(), stderr=(), exit_status=0, endless=False):
+        self.stdout = list(stdout)
+        self.stderr = list(stderr)
+        self.exit_status = exit_status
+        self.endless = endless
+        self.closed = False
+        self.eof_received = False
+
+    def recv_ready(self):
+        return bool(self.stdout) or self.endless
+
+    def recv(self, size):
+        return self.stdout.pop(0) if self.stdout else b"y\n" * 1000
+
+    def recv_stderr_ready(self):
+        return bool(self.stderr)
+
+    def recv_stderr(self, size):
+        return self.stderr.pop(0)
+
+    def exit_status_ready(self):
+        return not self.endless and not self.stdout and not self.stderr
+
+    def recv_exit_status(self):
+        return self.exit_status
+
+
+def test_read_channel_drains_both_streams():
+    channel = FakeChannel([b"out 1\n", b"out 2\n"], [b"err\n"], exit_status=2)
+    out, err = HeadTailBuffer(), HeadTailBuffer()
+
+    assert read_channel(channel, out, err, timeout=5) == (2, None)
+    assert out.result() == ("out 1\nout 2\n", 0)
+    assert err.result() == ("err\n", 0)
+
+
+def test_read_channel_stops_on_too_much_output():
+    out, err = HeadTailBuffer(), HeadTailBuffer()
+    status = read_channel(
+        FakeChannel(endless=True), out, err, timeout=5, max_read_bytes=100000
+    )
+    assert status == (None, "too_large")
+    assert out.total > 100000
+
+
+def test_read_channel_keeps_partial_output_on_timeout():
+    channel = FakeChannel([b"partial\n"])
+    channel.exit_status_ready = lambda: False
+    out, err = HeadTailBuffer(), HeadTailBuffer()
+
+    assert read_channel(channel, out, err, timeout=0.05) == (None, "timeout")
+    assert out.result() == ("partial\n", 0)
@@ -0,0 +1,277 @@
+"""Compact summaries of a Prometheus text exposition.
+
+The exposition is parsed into metric families and reduced to one row per
+series: counters with their rate since the previous scrape, gauges with their
+value and histograms with count, average and p50/p95/p99 estimated from the
+buckets (as histogram_quantile does) instead of every bucket line. When a
+previous scrape of the same target is known, histogram quantiles describe only
+the observations made since then.
+"""
+
+import math
+import re
+import threading
+import time
+
+from prometheus_client.parser import text_string_to_metric_families
+
+DEFAULT_MAX_ROWS = 15
+QUANTILES = (0.5, 0.95, 0.99)
+
+
+def parse_label_filter(spec):
+    """Parse "status=500,endpoint=~/users.*" into {label: (is_regex, value)}."""
+    selectors = {}
+    for part in (spec or "").split(","):
+        if not part.strip():
+            continue
+        name, separator, value = part.partition("=")
+        if not separator:
+            raise ValueError(f"Invalid label selector: {part.strip()!r}")
+        if value.startswith("~"):
+            selectors[name.strip()] = (True, re.compile(value[1:].strip()))
+        else:
+            selectors[name.strip()] = (False, value.strip())
+    return selectors
+
+
+def labels_match(labels, selectors):
+    for name, (is_regex, expected) in selectors.items():
+        value = labels.get(name)
+        if value is None:
+            return False
+        if is_regex and not expected.fullmatch(value):
+            return False
+        if not is_regex and value != expected:
+            return False
+    return True
+
+
+def histogram_quantile(q, buckets):
+    """Quantile from cumulative (upper bound, count) buckets sorted by bound."""
+    if not buckets or buckets[-1][1] <= 0:
+        return None
+    rank = q * buckets[-1][1]
+    lower_bound, lower_count = 0.0, 0.0
+    for upper_bound, count in buckets:
+        if count >= rank:
+            if math.isinf(upper_bound):
+                # Above the highest finite bucket: its bound is the best estimate
+                return lower_bound
+            if count == lower_count:
+                return upper_bound
+            return lower_bound + (upper_bound - lower_bound) * (
+                (rank - lower_count) / (count - lower_count)
+            )
+        lower_bound, lower_count = upper_bound, count
+    return lower_bound
+
+
+def series_key(name, labels):
+    return (name, tuple(sorted(labels.items())))
+
+
+def format_labels(labels):
+    if not labels:
+        return "-"
+    return ",".join(f"{k}={v}" for k, v in sorted(labels.items()))
+
+
+def format_number(value):
+    if value is None:
+        return "-"
+    if not math.isfinite(value):
+        return str(value)
+    if value == int(value) and abs(value) < 1e15:
+        return str(int(value))
+    return f"{value:.4g}"
+
+
+class ScrapeHistory:
+    """Last value seen of each series, per target, to turn counters into rates.
+
+    Values are kept per series, so a filtered call does not lose the history
+    of the series it did not read.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._series = {}
+
+    def previous(self, source):
+        with self._lock:
+            return dict(self._series.get(source, {}))
+
+    def update(self, source, samples, timestamp):
+        with self._lock:
+            series = self._series.setdefault(source, {})
+            for key, value in samples.items():
+                series[key] = (timestamp, value)
+
+
+scrape_history = ScrapeHistory()
+
+
+def _rate(key, value, previous, now):
+    if not previous or key not in previous:
+        return None
+    timestamp, last = previous[key]
+    delta = value - last
+    # A negative delta means the counter was reset (service restart)
+    if now <= timestamp or delta < 0:
+        return None
+    return delta / (now - timestamp)
+
+
+def _counter_rows(family, selectors, previous, now, samples):
+    rows = []
+    for sample in family.samples:
+        if sample.name.endswith("_created") or not labels_match(
+            sample.labels, selectors
+        ):
+            continue
+        key = series_key(sample.name, sample.labels)
+        samples[key] = sample.value
+        rows.append(
+            {
+                "labels": sample.labels,
+                "value": sample.value,
+                "rate": _rate(key, sample.value, previous, now),
+            }
+        )
+    return rows
+
+
+def _gauge_rows(family, selectors, samples):
+    rows = []
+    for sample in family.samples:
+        if not labels_match(sample.labels, selectors):
+            continue
+        samples[series_key(sample.name, sample.labels)] = sample.value
+        rows.append({"labels": sample.labels, "value": sample.value})
+    return rows
+
+
+def _histogram_rows(family, selectors, previous, now, samples):
+    series = {}
+    for sample in family.samples:
+        labels = {k: v for k, v in sample.labels.items() if k != "le"}
+        if not labels_match(labels, selectors):
+            continue
+        entry = series.setdefault(
+            tuple(sorted(labels.items())), {"labels": labels, "buckets": {}}
+        )
+        key = series_key(sample.name, sample.labels)
+        samples[key] = sample.value
+        if sample.name.endswith("_bucket"):
+            entry["buckets"][float(sample.labels["le"])] = key
+        elif sample.name.endswith("_count"):
+            entry["count"] = key
+        elif sample.name.endswith("_sum"):
+            entry["sum"] = key
+
+    rows = []
+    for entry in series.values():
+        if "count" not in entry:
+            continue
+        count = samples[entry["count"]]
+        total = samples.get(entry.get("sum"), 0.0)
+        rate = _rate(entry["count"], count, previous, now)
+        bounds = sorted(entry["buckets"])
+        buckets = [(b, samples[entry["buckets"][b]]) for b in bounds]
+
+        window = False
+        if rate:
+            # Quantiles and average over the observations since the last scrape
+            keys = [entry["buckets"][b] for b in bounds]
+            if all(k in previous for k in keys) and entry.get("sum") in previous:
+                buckets = [(b, v - previous[k][1]) for (b, v), k in zip(buckets, keys)]
+                count = count - previous[entry["count"]][1]
+                total = total - previous[entry["sum"]][1]
+                window = True
+
+        rows.append(
+            {
+                "labels": entry["labels"],
+                "value": samples[entry["count"]],
+                "rate": rate,
+                "avg": total / count if count else None,
+                "quantiles": [histogram_quantile(q, buckets) for q in QUANTILES],
+                "window": window,
+            }
+        )
+    return rows
+
+
+def summarize_exposition(
+    text,
+    name_filter=None,
+    label_filter=None,
+    previous=None,
+    now=None,
+    max_rows=DEFAULT_MAX_ROWS,
+):
+    """Summarize an exposition as a compact table.
+
+    `previous` maps series to the (timestamp, value) of an earlier scrape, as
+    kept by ScrapeHistory. Returns (table, samples); samples maps every series
+    read to its value.
+    """
+    now = time.monotonic() if now is None else now
+    name_pattern = re.compile(name_filter) if name_filter else None
+    selectors = parse_label_filter(label_filter)
+
+    samples = {}
+    lines = ["metric | labels | value | rate/s | avg | p50 | p95 | p99"]
+    families = 0
+    for family in text_string_to_metric_families(text):
+        # Counters are named after their samples ("_total"), as in PromQL
+        name = f"{family.name}_total" if family.type == "counter" else family.name
+        # Creation timestamps of counters and histograms are not useful here
+        if name.endswith("_created"):
+            continue
+        if name_pattern and not name_pattern.search(name):
+            continue
+
+        if family.type == "counter":
+            rows = _counter_rows(family, selectors, previous, now, samples)
+        elif family.type == "histogram":
+            rows = _histogram_rows(family, selectors, previous, now, samples)
+        elif family.type in ("gauge", "untyped", "unknown"):
+            rows = _gauge_rows(family, selectors, samples)
+        else:
+            # Summaries and info metrics are not produced by the services
+            continue
+        if not rows:
+            continue
+
+        families += 1
+        rows.sort(key=lambda r: (r.get("rate") or 0, r["value"]), reverse=True)
+        for row in rows[:max_rows]:
+            quantiles = row.get("quantiles") or (None,) * len(QUANTILES)
+            cells = [
+                name,
+                format_labels(row["labels"]),
+                format_number(row["value"]),
+                format_number(row.get("rate")),
+                format_number(row.get("avg")),
+            ]
+            cells.extend(format_number(q) for q in quantiles)
+            lines.append(
+                " | ".join(cells)
+                + (" (since last scrape)" if row.get("window") else "")
+            )
+        if len(rows) > max_rows:
+            lines.append(
+                f"{name} | ... {len(rows) - max_rows} more series (use labels to filter)"
+            )
+
+    if not families:
+        return "No metrics matched the filters.", samples
+    return "\n".join(lines), samples
+
+
+def sample_total(samples, name):
+    """Sum of all series of a metric in a samples dict."""
+    values = [v for (n, _), v in samples.items() if n == name]
+    return sum(values) if values else None
@@ -0,0 +1,53 @@
+"""HTTP session shared by the crew tools.
+
+A single requests.Session keeps connections to the user-service, Prometheus and
+the snapshot service alive between tool calls. fetch_all() runs several GETs
+concurrently and bounds them with one overall deadline, so a slow endpoint
+costs at most the deadline instead of adding its timeout to the others.
+"""
+
+import os
+from concurrent.futures import ThreadPoolExecutor, wait
+
+import requests
+from requests.adapters import HTTPAdapter
+
+HTTP_POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", "10"))
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "3"))
+
+session = requests.Session()
+_adapter = HTTPAdapter(pool_connections=HTTP_POOL_SIZE, pool_maxsize=HTTP_POOL_SIZE)
+session.mount("http://", _adapter)
+session.mount("https://", _adapter)
+
+_executor = ThreadPoolExecutor(max_workers=HTTP_POOL_SIZE, thread_name_prefix="http")
+
+
+def get(url, timeout, **kwargs):
+    """GET through the shared session; timeout bounds the read."""
+    return session.get(
+        url, timeout=(min(HTTP_CONNECT_TIMEOUT, timeout), timeout), **kwargs
+    )
+
+
+def fetch_all(urls, deadline):
+    """GET every {name: url} concurrently within `deadline` seconds.
+
+    Returns {name: response or exception}. Requests still running at the
+    deadline are reported as requests.exceptions.Timeout.
+    """
+    futures = {name: _executor.submit(get, url, deadline) for name, url in urls.items()}
+    wait(futures.values(), timeout=deadline)
+
+    results = {}
+    for name, future in futures.items():
+        if not future.done():
+            future.cancel()
+            results[name] = requests.exceptions.Timeout(
+                f"No response from {urls[name]} within {deadline:g}s"
+            )
+        elif future.exception() is not None:
+            results[name] = future.exception()
+        else:
+            results[name] = future.result()
+    return results
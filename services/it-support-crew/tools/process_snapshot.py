@@ -0,0 +1,137 @@
+import logging
+import os
+from typing import Type
+
+import requests
+from crewai.tools import BaseTool
+from pydantic import BaseModel, Field
+from tools import http_client
+from tools.run_cache import run_cache
+from tools.ssh_pool import load_servers_config
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SNAPSHOT_PORT = 9257
+# Snapshots are reused within a crew run for this many seconds
+SNAPSHOT_CACHE_TTL = 10
+
+
+class ProcessSnapshotToolInput(BaseModel):
+    """Input schema for the ProcessSnapshotTool."""
+
+    server: str = Field(
+        default="user-service",
+        description="Name of the server in the configuration. Defaults to user-service.",
+    )
+    top: int = Field(
+        default=10,
+        description="Number of processes to list (1-50). Defaults to 10.",
+    )
+    sort: str = Field(
+        default="cpu",
+        description="Order of the process list: 'cpu' or 'rss' (memory). Defaults to cpu.",
+    )
+
+
+class ProcessSnapshotTool(BaseTool):
+    name: str = "ProcessSnapshotTool"
+    description: str = """
+    Tool for getting a structured snapshot of a server in a single call.
+    Returns load averages, CPU and memory usage, and the top processes with
+    PID, user, CPU%, MEM%, RSS, threads, open file descriptors, start time
+    and command line, plus details of the user_service process.
+    Prefer this tool over running ps/top/free through SSH.
+    """
+    args_schema: Type[BaseModel] = ProcessSnapshotToolInput
+
+    def _run(
+        self, server: str = "user-service", top: int = 10, sort: str = "cpu"
+    ) -> str:
+        """
+        Queries the snapshot service running on the server.
+
+        Args:
+            server (str): Name of the server in the configuration.
+            top (int): Number of processes to list.
+            sort (str): 'cpu' or 'rss'.
+
+        Returns:
+            str: Compact text view of the snapshot
+        """
+        config = load_servers_config()
+        if config is None:
+            return "Error: Configuration file not found."
+        server_config = config.get("servers", {}).get(server)
+        if server_config is None:
+            return f"Error: Server '{server}' not found in configuration"
+
+        key = (server, top, sort)
+        cached = run_cache.get(self.name, key)
+        if cached is not None:
+            result, age = cached
+            return f"[Cached result from {age:.0f}s ago]\n{result}"
+
+        # For the local environment, we use localhost and the mapped port
+        port = server_config.get("snapshot_port", DEFAULT_SNAPSHOT_PORT)
+        url = f"http://localhost:{port}/snapshot"
+        token = server_config.get("snapshot_token") or os.getenv("SNAPSHOT_TOKEN", "")
+
+        try:
+            response = http_client.get(
+                url,
+                10,
+                params={"top": top, "sort": sort},
+                headers={"X-Snapshot-Token": token},
+            )
+        except requests.exceptions.RequestException as e:
+            logger.error(f"Error collecting snapshot: {str(e)}")
+            return f"Error connecting to snapshot service: {str(e)}"
+
+        if response.status_code != 200:
+            return f"Error collecting snapshot: HTTP {response.status_code}\n{response.text}"
+
+        try:
+            result = self._format(response.json())
+        except (ValueError, KeyError, TypeError) as e:
+            logger.error(f"Invalid snapshot response: {str(e)}")
+            return f"Error: Invalid response from snapshot service: {str(e)}"
+        run_cache.put(self.name, key, result, SNAPSHOT_CACHE_TTL)
+        return result
+
+    def _format(self, snapshot: dict) -> str:
+        system = snapshot["system"]
+        memory = system["memory"]
+        load = ", ".join(str(v) for v in system["load_average"])
+        lines = [
+            f"Snapshot at {snapshot['timestamp']}",
+            f"Load average (1/5/15 min): {load} on {system['cpu_count']} CPUs",
+            f"CPU usage: {system['cpu_percent']}%",
+            f"Memory: {memory['used_percent']}% used, "
+            f"{memory['available_mb']} MB available of {memory['total_mb']} MB",
+            f"Swap: {system['swap']['used_percent']}% used of {system['swap']['total_mb']} MB",
+            f"Processes: {system['processes']} {system['process_status']}",
+        ]
+
+        service = snapshot.get("service")
+        if service:
+            lines.append(
+                f"\nuser_service: PID {service['pid']}, CPU {service['cpu_percent']}%, "
+                f"RSS {service['rss_mb']} MB, {service['threads']} threads, "
+                f"{service['fds']} fds, {service['open_files']} open files, "
+                f"connections {service['connections']}, up {service['uptime_seconds']}s"
+            )
+        else:
+            lines.append("\nuser_service: process not found")
+
+        top = snapshot["top_processes"]
+        lines.append(f"\nTop processes by {top['sort']}:")
+        lines.append(
+            "PID | USER | CPU% | MEM% | RSS MB | THREADS | FDS | STARTED | COMMAND"
+        )
+        for row in top["rows"]:
+            lines.append(
+                f"{row['pid']} | {row['user']} | {row['cpu_percent']} | "
+                f"{row['memory_percent']} | {row['rss_mb']} | {row['threads']} | "
+                f"{row['fds']} | {row['started']} | {row['cmdline']}"
+            )
+        return "\n".join(lines)
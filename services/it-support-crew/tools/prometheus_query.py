@@ -0,0 +1,222 @@
+import logging
+import math
+import os
+import time
+from typing import Optional, Type
+
+import requests
+from crewai.tools import BaseTool
+from pydantic import BaseModel, Field
+from tools import http_client
+from tools.exposition import format_labels, format_number
+from tools.run_cache import run_cache
+
+logger = logging.getLogger(__name__)
+
+PROMETHEUS_URL = os.getenv("PROMETHEUS_URL", "http://localhost:9090")
+PROMQL_MAX_SERIES = 10
+PROMQL_MAX_MINUTES = 24 * 60
+# Range queries return at most about this many points per series
+PROMQL_TARGET_POINTS = 60
+PROMQL_MIN_STEP = 15
+# Points shown per series in the downsampled trend
+PROMQL_TREND_POINTS = 6
+# Cached instant values are reused for this many seconds. A range query result
+# only changes when its step-aligned end moves, so it is cached for one step.
+PROMQL_INSTANT_CACHE_TTL = float(os.getenv("PROMQL_INSTANT_CACHE_TTL", "15"))
+
+
+def _finite_points(values):
+    points = []
+    for timestamp, value in values:
+        value = float(value)
+        if math.isfinite(value):
+            points.append((float(timestamp), value))
+    return points
+
+
+def _instant_value(series):
+    value = float(series["value"][1])
+    return value if math.isfinite(value) else -math.inf
+
+
+def slope_per_minute(points):
+    """Least-squares slope of the points, in units per minute."""
+    if len(points) < 2:
+        return None
+    mean_t = sum(t for t, _ in points) / len(points)
+    mean_v = sum(v for _, v in points) / len(points)
+    variance = sum((t - mean_t) ** 2 for t, _ in points)
+    if variance == 0:
+        return None
+    covariance = sum((t - mean_t) * (v - mean_v) for t, v in points)
+    return covariance / variance * 60
+
+
+def downsample(points, buckets=PROMQL_TREND_POINTS):
+    """Average of the values in `buckets` consecutive, equal-sized chunks."""
+    if len(points) <= buckets:
+        return [v for _, v in points]
+    size = len(points) / buckets
+    trend = []
+    for i in range(buckets):
+        chunk = points[int(i * size) : int((i + 1) * size)]
+        trend.append(sum(v for _, v in chunk) / len(chunk))
+    return trend
+
+
+def summarize_series(points):
+    values = [v for _, v in points]
+    return {
+        "points": len(points),
+        "min": min(values),
+        "max": max(values),
+        "avg": sum(values) / len(values),
+        "first": values[0],
+        "last": values[-1],
+        "slope": slope_per_minute(points),
+        "trend": downsample(points),
+    }
+
+
+class PrometheusQueryToolInput(BaseModel):
+    """Input schema for the PrometheusQueryTool."""
+
+    query: str = Field(
+        ...,
+        description="PromQL expression, e.g. 'rate(http_requests_total[1m])' or 'process_resident_memory_bytes'",
+    )
+    minutes: Optional[int] = Field(
+        None,
+        description="Look back this many minutes and summarize the trend (range query). Omit for the current value only.",
+    )
+    step: Optional[int] = Field(
+        None,
+        description="Resolution of the range query in seconds. Defaults to about 60 points over the range.",
+    )
+
+
+class PrometheusQueryTool(BaseTool):
+    name: str = "PrometheusQueryTool"
+    description: str = """
+    Tool for running PromQL queries against Prometheus.
+    Use this tool to:
+    1. Get the current value of any metric or expression (omit minutes)
+    2. Check trends over the last minutes (set minutes, e.g. 15): each series is
+       summarized as min, max, avg, first, last, slope per minute and a short
+       downsampled trend, instead of every data point
+    Example: query="node_memory_MemAvailable_bytes", minutes=15
+    Results are cached during the incident run, so repeating a query is cheap.
+    """
+    args_schema: Type[BaseModel] = PrometheusQueryToolInput
+
+    def _run(
+        self, query: str, minutes: Optional[int] = None, step: Optional[int] = None
+    ) -> str:
+        """
+        Runs an instant or range PromQL query.
+
+        Args:
+            query (str): PromQL expression.
+            minutes (int, optional): Range to look back, in minutes.
+            step (int, optional): Range query resolution, in seconds.
+
+        Returns:
+            str: Compact summary of the result series
+        """
+        query = query.strip()
+        if not query:
+            return "Error: Empty query"
+        if minutes is not None:
+            minutes = max(1, min(int(minutes), PROMQL_MAX_MINUTES))
+            if not step:
+                step = (minutes * 60) // PROMQL_TARGET_POINTS
+            step = max(PROMQL_MIN_STEP, int(step))
+
+        key = (query, minutes, step)
+        cached = run_cache.get(self.name, key)
+        if cached is not None:
+            result, age = cached
+            return f"[Cached result from {age:.0f}s ago]\n{result}"
+
+        try:
+            if minutes is None:
+                result = self._instant(query)
+            else:
+                result = self._range(query, minutes, step)
+        except requests.exceptions.RequestException as e:
+            logger.error(f"Error querying Prometheus: {str(e)}")
+            return f"Error connecting to Prometheus: {str(e)}"
+        except ValueError as e:
+            return f"Error: {str(e)}"
+
+        ttl = PROMQL_INSTANT_CACHE_TTL if minutes is None else step
+        run_cache.put(self.name, key, result, ttl)
+        return result
+
+    def _request(self, path: str, params: dict) -> dict:
+        response = http_client.get(f"{PROMETHEUS_URL}{path}", 10, params=params)
+        try:
+            body = response.json()
+        except ValueError:
+            raise ValueError(f"Prometheus returned HTTP {response.status_code}")
+        if body.get("status") != "success":
+            raise ValueError(
+                f"Query failed: {body.get('errorType', '')} {body.get('error', '')}".strip()
+            )
+        return body["data"]
+
+    def _instant(self, query: str) -> str:
+        data = self._request("/api/v1/query", {"query": query})
+        result_type, result = data["resultType"], data["result"]
+        if result_type in ("scalar", "string"):
+            return f"{query} = {result[1]}"
+        if result_type == "matrix":
+            raise ValueError(
+                "The query returns a range vector; set minutes to summarize it"
+            )
+        if not result:
+            return f"No series returned for {query}"
+
+        rows = sorted(result, key=_instant_value, reverse=True)
+        lines = [f"{query} ({len(result)} series)", "labels | value"]
+        for series in rows[:PROMQL_MAX_SERIES]:
+            value = float(series["value"][1])
+            lines.append(f"{format_labels(series['metric'])} | {format_number(value)}")
+        if len(rows) > PROMQL_MAX_SERIES:
+            lines.append(f"... {len(rows) - PROMQL_MAX_SERIES} more series")
+        return "\n".join(lines)
+
+    def _range(self, query: str, minutes: int, step: int) -> str:
+        # Aligning the end to the step keeps repeated queries on the same points
+        end = int(time.time()) // step * step
+        data = self._request(
+            "/api/v1/query_range",
+            {"query": query, "start": end - minutes * 60, "end": end, "step": step},
+        )
+        summaries = []
+        for series in data["result"]:
+            points = _finite_points(series.get("values", []))
+            if points:
+                summaries.append((series["metric"], summarize_series(points)))
+        if not summaries:
+            return f"No data for {query} in the last {minutes} minutes"
+
+        summaries.sort(key=lambda s: s[1]["last"], reverse=True)
+        lines = [
+            f"{query} over the last {minutes} min, step {step}s "
+            f"({len(summaries)} series)",
+            "labels | min | max | avg | first | last | slope/min | trend",
+        ]
+        for labels, summary in summaries[:PROMQL_MAX_SERIES]:
+            trend = " ".join(format_number(v) for v in summary["trend"])
+            cells = [format_labels(labels)]
+            cells.extend(
+                format_number(summary[k])
+                for k in ("min", "max", "avg", "first", "last", "slope")
+            )
+            cells.append(f"[{trend}]")
+            lines.append(" | ".join(cells))
+        if len(summaries) > PROMQL_MAX_SERIES:
+            lines.append(f"... {len(summaries) - PROMQL_MAX_SERIES} more series")
+        return "\n".join(lines)
@@ -0,0 +1,266 @@
+"""Cache of tool results shared by the agents during one crew run.
+
+The L1, L2 and L3 tasks of an incident repeat nearly the same diagnostic calls
+minutes apart (ps, free, metrics). Results are cached per (tool, normalized
+input) with a short TTL that depends on how fast the data goes stale, and the
+cache is emptied when a new run starts.
+
+State-changing commands (kill, pkill, ...) are never cached and drop every
+cached result, so later checks see the new state. Only commands made of known
+read-only programs are cached at all.
+"""
+
+import os
+import re
+import shlex
+import threading
+import time
+
+from tools.tool_metrics import TOOL_CACHE_LOOKUPS
+
+TOOL_CACHE_DEFAULT_TTL = float(os.getenv("TOOL_CACHE_DEFAULT_TTL", "15"))
+
+# TTL in seconds by the program a command runs
+COMMAND_TTLS = {
+    "ps": 20,
+    "top": 20,
+    "free": 20,
+    "uptime": 20,
+    "vmstat": 20,
+    "netstat": 20,
+    "ss": 20,
+    "lsof": 20,
+    "df": 60,
+    "du": 60,
+    "cat": 10,
+    "tail": 10,
+    "head": 10,
+    "grep": 10,
+    "journalctl": 10,
+}
+
+# Programs that only read state; other programs are never cached
+READ_ONLY_PROGRAMS = set(COMMAND_TTLS) | {
+    "ls",
+    "stat",
+    "wc",
+    "sort",
+    "uniq",
+    "cut",
+    "tr",
+    "echo",
+    "date",
+    "id",
+    "whoami",
+    "hostname",
+    "uname",
+    "nproc",
+    "pgrep",
+    "pidof",
+    "iostat",
+    "mpstat",
+    "pidstat",
+    "zcat",
+    "zgrep",
+    "egrep",
+}
+
+# Programs that change the state of the server
+STATE_CHANGING_PROGRAMS = {
+    "kill",
+    "pkill",
+    "killall",
+    "renice",
+    "systemctl",
+    "service",
+    "supervisorctl",
+    "reboot",
+    "shutdown",
+    "rm",
+    "rmdir",
+    "mv",
+    "cp",
+    "dd",
+    "ln",
+    "mkdir",
+    "touch",
+    "truncate",
+    "tee",
+    "chmod",
+    "chown",
+    "sysctl",
+    "mount",
+    "umount",
+    "iptables",
+    "docker",
+    "crontab",
+    "logrotate",
+}
+
+# Wrappers that run another program, with their options that take an argument
+WRAPPERS = {
+    "sudo": {"-u", "-g", "-C", "-D", "-h", "-p", "-r", "-t", "-U"},
+    "nice": {"-n"},
+    "ionice": {"-c", "-n", "-p", "-P", "-u"},
+    "stdbuf": {"-i", "-o", "-e"},
+    "timeout": {"-s", "-k"},
+    "env": {"-u", "-C", "-S"},
+    "xargs": {"-I", "-E", "-d", "-L", "-n", "-P", "-s", "-a"},
+    "nohup": set(),
+    "command": set(),
+    "exec": set(),
+    "time": set(),
+}
+SHELLS = {"sh", "bash", "dash", "zsh"}
+ASSIGNMENT = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*=")
+
+
+def normalize_command(command):
+    return " ".join(command.split())
+
+
+def command_programs(command):
+    """Programs a shell command line runs, in order.
+
+    Every command position counts (after ; & | ( and inside $(...) or
+    backticks), wrappers such as sudo -u root, nice -n 5 or timeout 5 are
+    skipped, and the body of sh/bash -c '...' is parsed as well. Quoted
+    arguments are single words, so "grep 'a|kill'" runs only grep.
+
+    Raises ValueError when the command cannot be parsed (e.g. open quotes).
+    """
+    lexer = shlex.shlex(command.replace("`", " ; "), posix=True, punctuation_chars=True)
+    lexer.whitespace_split = True
+    tokens = list(lexer)
+
+    programs = []
+    at_start = True
+    i = 0
+    while i < len(tokens):
+        token = tokens[i]
+        i += 1
+        if "<" in token or ">" in token:
+            # Redirection: the next word is its target
+            if not token.endswith("&"):
+                i += 1
+            continue
+        if token and all(c in ";&|()" for c in token):
+            at_start = True
+            continue
+        if not at_start or ASSIGNMENT.match(token):
+            continue
+
+        name = os.path.basename(token)
+        if name in WRAPPERS:
+            while i < len(tokens) and tokens[i].startswith("-"):
+                i += 2 if tokens[i] in WRAPPERS[name] else 1
+            if name == "timeout":
+                i += 1  # duration
+            continue
+
+        at_start = False
+        body = _shell_body(tokens, i) if name in SHELLS else None
+        if body is None:
+            programs.append(name)
+        else:
+            # sh -c '...' runs only what its body runs
+            programs.extend(command_programs(body))
+    return programs
+
+
+def _shell_body(tokens, start):
+    """Command string of a shell's -c option (also combined, as in -xc)."""
+    for index in range(start, len(tokens)):
+        token = tokens[index]
+        if token == "--" or not token.startswith("-"):
+            return None
+        if token.startswith("--"):
+            continue  # long options such as --login
+        if "c" in token[1:] and index + 1 < len(tokens):
+            return tokens[index + 1]
+    return None
+
+
+def writes_files(command):
+    """Output redirection to a file, or in-place editing with sed/perl -i."""
+    if re.search(r"(^|[^0-9&])>{1,2}\s*[^&\s]", command.replace("2>&1", "")):
+        return True
+    return bool(re.search(r"(^|[\s;&|(])(sed|perl)\s+(-\S+\s+)*-i", command))
+
+
+def is_state_changing(command):
+    """True when the command may change the server (commands that cannot be
+    parsed count as state-changing)."""
+    try:
+        programs = command_programs(command)
+    except ValueError:
+        return True
+    return any(p in STATE_CHANGING_PROGRAMS for p in programs) or writes_files(command)
+
+
+def is_cacheable(command):
+    """True when every program the command runs is known to only read state."""
+    try:
+        programs = command_programs(command)
+    except ValueError:
+        return False
+    return (
+        bool(programs)
+        and all(p in READ_ONLY_PROGRAMS for p in programs)
+        and not writes_files(command)
+    )
+
+
+def command_ttl(command):
+    """TTL of a command: the shortest TTL among the programs it runs."""
+    try:
+        programs = command_programs(command)
+    except ValueError:
+        programs = []
+    if not programs:
+        return TOOL_CACHE_DEFAULT_TTL
+    return min(COMMAND_TTLS.get(p, TOOL_CACHE_DEFAULT_TTL) for p in programs)
+
+
+class RunCache:
+    """Thread-safe TTL cache, emptied at the start of each crew run."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = {}
+        self.run_id = None
+
+    def start_run(self, run_id=None):
+        with self._lock:
+            self._entries.clear()
+            self.run_id = run_id
+
+    def get(self, tool, key):
+        """Return (value, age in seconds), or None on a miss."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get((tool, key))
+            if entry is not None:
+                stored_at, expires_at, value = entry
+                if now < expires_at:
+                    TOOL_CACHE_LOOKUPS.labels(tool, "hit").inc()
+                    return value, now - stored_at
+                del self._entries[(tool, key)]
+        TOOL_CACHE_LOOKUPS.labels(tool, "miss").inc()
+        return None
+
+    def put(self, tool, key, value, ttl):
+        now = time.monotonic()
+        with self._lock:
+            self._entries[(tool, key)] = (now, now + ttl, value)
+
+    def bypass(self, tool):
+        TOOL_CACHE_LOOKUPS.labels(tool, "bypass").inc()
+
+    def invalidate(self):
+        """Drop every entry (after a command changed the server state)."""
+        with self._lock:
+            self._entries.clear()
+
+
+run_cache = RunCache()
@@ -0,0 +1,83 @@
+"""Run several diagnostic commands in a single SSH exec.
+
+The commands are wrapped in one shell script that writes a begin/end marker
+around each command on both stdout and stderr. The markers carry a random
+nonce, so command output cannot be mistaken for a marker, and the end marker
+carries the exit code and the duration measured on the remote host.
+"""
+
+import re
+import secrets
+import shlex
+
+SSH_BATCH_MAX_COMMANDS = 10
+
+
+def new_nonce():
+    return f"__batch_{secrets.token_hex(8)}"
+
+
+def build_batch_script(commands, nonce, command_timeout):
+    """Shell script that runs each command with its own timeout, in order."""
+    lines = []
+    for index, command in enumerate(commands):
+        lines.extend(
+            [
+                f"printf '%s:begin:{index}\\n' {nonce}",
+                f"printf '%s:begin:{index}\\n' {nonce} >&2",
+                "__start=$(date +%s%N)",
+                f"timeout {command_timeout} sh -c {shlex.quote(command)} </dev/null",
+                "__rc=$?",
+                "__end=$(date +%s%N)",
+                f"printf '\\n%s:end:{index}:%s:%s\\n' {nonce} "
+                '"$__rc" "$((__end - __start))"',
+                f"printf '\\n%s:end:{index}\\n' {nonce} >&2",
+            ]
+        )
+    return "\n".join(lines) + "\n"
+
+
+def _sections(output, nonce, with_status):
+    """Map command index -> (text, exit code, duration ns) from marked output."""
+    status = r":(-?\d+):(\d+)" if with_status else r"()()"
+    pattern = re.compile(
+        rf"{nonce}:begin:(\d+)\n(.*?)\n{nonce}:end:\1{status}\n", re.DOTALL
+    )
+    return {
+        int(m.group(1)): (m.group(2), m.group(3), m.group(4))
+        for m in pattern.finditer(output)
+    }
+
+
+def parse_batch_output(commands, stdout, stderr, nonce):
+    """Per-command results (stdout, stderr, exit code, duration) in order."""
+    out_sections = _sections(stdout, nonce, with_status=True)
+    err_sections = _sections(stderr, nonce, with_status=False)
+
+    results = []
+    for index, command in enumerate(commands):
+        result = {"command": command}
+        if index in out_sections:
+            text, exit_code, duration_ns = out_sections[index]
+            result.update(
+                {
+                    "exit_code": int(exit_code),
+                    "duration_ms": round(int(duration_ns) / 1e6, 1),
+                    # timeout(1) exits with 124 when the command is killed
+                    "timed_out": int(exit_code) == 124,
+                    "stdout": text,
+                }
+            )
+        else:
+            result.update(
+                {
+                    "exit_code": None,
+                    "duration_ms": None,
+                    "timed_out": False,
+                    "stdout": "",
+                    "error": "Command did not complete",
+                }
+            )
+        result["stderr"] = err_sections.get(index, ("",))[0]
+        results.append(result)
+    return results
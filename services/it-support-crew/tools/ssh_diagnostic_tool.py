@@ -1,13 +1,34 @@
+import json
 import logging
-import os
+import shlex
 import socket
 import time
-from typing import Type
+from typing import List, Optional, Type
 
 import paramiko
-import yaml
 from crewai.tools import BaseTool
 from pydantic import BaseModel, Field
+from tools.ssh_batch import (
+    SSH_BATCH_MAX_COMMANDS,
+    build_batch_script,
+    new_nonce,
+    parse_batch_output,
+)
+from tools.ssh_output import (
+    CappedBuffer,
+    HeadTailBuffer,
+    read_channel,
+    truncate_text,
+)
+from tools.run_cache import (
+    command_ttl,
+    is_cacheable,
+    is_state_changing,
+    normalize_command,
+    run_cache,
+)
+from tools.ssh_pool import load_servers_config, ssh_pool
+from tools.tool_metrics import SSH_EXEC_DURATION, SSH_OUTPUT_TRUNCATED_BYTES
 
 logger = logging.getLogger(__name__)
 
@@ -19,6 +40,14 @@ class SSHDiagnosticToolInput(BaseModel):
         ...,
         description="Query in format 'server|command' where server is the name from config and command is the command to execute",
     )
+    commands: Optional[List[str]] = Field(
+        None,
+        description="Optional list of commands to run together in one SSH session; query may then be just the server name",
+    )
+    filter: Optional[str] = Field(
+        None,
+        description="Optional extended regex; only output lines matching it are returned (filtered on the server)",
+    )
 
 
 class SSHDiagnosticTool(BaseTool):
@@ -33,10 +62,23 @@ class SSHDiagnosticTool(BaseTool):
     Input format: "server|command"
     Example: "user-service|ps aux | grep python"
     Available servers: user-service
+
+    To run several commands at once, pass query="server" and a list in
+    commands, e.g. commands=["uptime", "free -m", "ps aux --sort=-%cpu | head -10"].
+    The result is JSON with stdout, stderr, exit_code and duration_ms per command.
+
+    Long outputs are truncated to their first and last lines. To look for
+    something specific in a large output, pass filter="error|timeout" and only
+    the matching lines are returned (exit code 1 then means no line matched).
     """
     args_schema: Type[BaseModel] = SSHDiagnosticToolInput
 
-    def _run(self, query: str) -> str:
+    def _run(
+        self,
+        query: str,
+        commands: Optional[List[str]] = None,
+        filter: Optional[str] = None,
+    ) -> str:
         """
         Executes a diagnostic command via SSH on a specific server.
 
@@ -44,128 +86,74 @@ class SSHDiagnosticTool(BaseTool):
             query (str): String in the format "server|command"
                          where server is the name of the server in the configuration
                          and command is the command to be executed.
+            commands (list[str], optional): Commands to run in a single SSH
+                         session. The command in query, if any, runs first.
+            filter (str, optional): Extended regex applied with grep on the
+                         server to the output of each command.
 
         Returns:
-            str: Result of the command executed via SSH
+            str: Result of the command executed via SSH, or a JSON document with
+                 one result per command for batches
         """
         try:
-            parts = query.split("|", 1)
-            if len(parts) != 2:
+            server_name, separator, command = query.partition("|")
+            batch = [c for c in (commands or []) if c and c.strip()]
+            if not batch and not separator:
                 return "Error: Incorrect format. Use 'server|command'"
+            if batch:
+                server_name = server_name.strip()
+                if command.strip():
+                    batch.insert(0, command)
+                if len(batch) > SSH_BATCH_MAX_COMMANDS:
+                    return f"Error: At most {SSH_BATCH_MAX_COMMANDS} commands per batch"
 
-            server_name, command = parts
-
-            # Load server configurations
-            # Adjust the path as needed for the local environment
-            config_path = "./config/servers.yaml"
-            if not os.path.exists(config_path):
-                config_path = "/home/manoel/v2_multi_agent_it_support/services/it-support-crew/config/servers.yaml"
-                if not os.path.exists(config_path):
-                    return "Error: Server configuration file not found"
-
-            with open(config_path, "r") as file:
-                config = yaml.safe_load(file)
-
-            servers = config.get("servers", {})
-            if server_name not in servers:
-                return f"Error: Server '{server_name}' not found in configuration"
-
-            server_config = servers[server_name]
-
-            # For the local environment, we use localhost and the mapped port
-            hostname = "localhost"
-            port = server_config.get(
-                "ssh_port", 2222
-            )  # Use ssh_port if set, or default to 2222
-            username = server_config["username"]
-            password = server_config["password"]
+            if filter:
+                # Filtrar no servidor evita trafegar e truncar a saída inteira
+                pattern = shlex.quote(filter)
+                command = f"{command} | grep -E -e {pattern}"
+                batch = [f"{c} | grep -E -e {pattern}" for c in batch]
 
-            logger.info(f"Connecting via SSH to {hostname}:{port} with user {username}")
+            params, error = self._resolve_server(server_name)
+            if error:
+                return error
 
-            # Timeouts rigorosos para evitar bloqueios
-            connect_timeout = 5  # 5 segundos para conexão
-            command_timeout = 8  # 8 segundos para comandos
-
-            # Criar cliente SSH com configurações de timeout rigorosas
-            client = paramiko.SSHClient()
-            client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-
-            try:
-                logger.info("Iniciando conexão SSH...")
-                client.connect(
-                    hostname,
-                    port=port,
-                    username=username,
-                    password=password,
-                    timeout=connect_timeout,
-                    banner_timeout=connect_timeout,
-                    auth_timeout=connect_timeout,
+            # Resultados recentes da mesma execução da crew são reaproveitados
+            commands_run = batch or [command]
+            cache_key = None
+            if any(is_state_changing(c) for c in commands_run):
+                # O estado do servidor muda: nada em cache continua válido
+                run_cache.bypass(self.name)
+                run_cache.invalidate()
+            elif not all(is_cacheable(c) for c in commands_run):
+                # Programas desconhecidos nunca são reaproveitados
+                run_cache.bypass(self.name)
+            else:
+                cache_key = (
+                    server_name,
+                    tuple(normalize_command(c) for c in commands_run),
+                    bool(batch),
                 )
+                cached = run_cache.get(self.name, cache_key)
+                if cached is not None:
+                    result, age = cached
+                    return f"[Cached result from {age:.0f}s ago]\n{result}"
 
-                logger.info(f"Executando comando: {command}")
-
-                # Executar comando com timeout explícito
-                stdin, stdout, stderr = client.exec_command(
-                    command,
-                    timeout=command_timeout,
-                    # Não alocar um PTY, que pode causar bloqueios
-                    get_pty=False,
-                )
-
-                # Configurar timeout na leitura - verificando se o método existe antes
-                if hasattr(stdout.channel, "settimeout"):
-                    stdout.channel.settimeout(command_timeout)
-                if hasattr(stderr.channel, "settimeout"):
-                    stderr.channel.settimeout(command_timeout)
-
-                # Leitura com tratamento de timeout
-                try:
-                    output = stdout.read().decode("utf-8", errors="replace")
-                except socket.timeout:
-                    output = "[Timeout na leitura da saída do comando]"
-                except Exception as e:
-                    output = f"[Erro ao ler saída: {str(e)}]"
-
-                try:
-                    errors = stderr.read().decode("utf-8", errors="replace")
-                except socket.timeout:
-                    errors = "[Timeout na leitura de erros]"
-                except Exception as e:
-                    errors = f"[Erro ao ler erros: {str(e)}]"
-
-                # Checar status do canal de maneira segura
-                try:
-                    # Verifique se o método existe antes de chamá-lo
-                    if (
-                        hasattr(stdout.channel, "exit_status_ready")
-                        and stdout.channel.exit_status_ready()
-                    ):
-                        exit_status = stdout.channel.recv_exit_status()
-                        if exit_status != 0:
-                            errors += (
-                                f"\n[Comando retornou código de erro: {exit_status}]"
-                            )
-                except Exception:
-                    # Ignora erros ao tentar obter status
-                    pass
-
-                # Fechar o canal com segurança
-                try:
-                    # Somente tente fechar se houver o método
-                    if hasattr(stdout.channel, "close"):
-                        stdout.channel.close()
-                    if hasattr(stderr.channel, "close"):
-                        stderr.channel.close()
-                except Exception:
-                    # Ignora erros ao fechar os canais
-                    pass
-
-                # Processar resultado e retornar
-                result = output
-                if errors and not errors.isspace() and errors.strip():
-                    result += f"\nErros: {errors}"
-
-                return result
+            try:
+                # Conexões autenticadas são reaproveitadas entre chamadas
+                with ssh_pool.connection(server_name, params) as client:
+                    start = time.perf_counter()
+                    if batch:
+                        result, ok = self._execute_batch(client, server_name, batch)
+                    else:
+                        result, ok = self._execute(client, server_name, command)
+                    SSH_EXEC_DURATION.labels(server_name).observe(
+                        time.perf_counter() - start
+                    )
+                    # Erros e timeouts não ficam em cache: a próxima chamada tenta de novo
+                    if cache_key is not None and ok:
+                        ttl = min(command_ttl(c) for c in commands_run)
+                        run_cache.put(self.name, cache_key, result, ttl)
+                    return result
 
             except paramiko.SSHException as e:
                 return f"Erro SSH: {str(e)}"
@@ -173,14 +161,132 @@ class SSHDiagnosticTool(BaseTool):
                 return "Timeout na operação SSH. O servidor pode estar sobrecarregado."
             except Exception as e:
                 return f"Erro executando comando: {str(e)}"
-            finally:
-                # Garantir que a conexão seja fechada corretamente
-                try:
-                    client.close()
-                    logger.info("Conexão SSH encerrada")
-                except Exception:
-                    pass
 
         except Exception as e:
             logger.error(f"Erro na ferramenta SSH: {str(e)}")
             return f"Erro na ferramenta SSH: {str(e)}"
+
+    def _resolve_server(self, server_name: str):
+        """Returns (connection params, None) or (None, error message)."""
+        # Load server configurations (cached until the file changes)
+        config = load_servers_config()
+        if config is None:
+            return None, "Error: Server configuration file not found"
+
+        servers = config.get("servers", {})
+        if server_name not in servers:
+            return None, f"Error: Server '{server_name}' not found in configuration"
+
+        server_config = servers[server_name]
+
+        # For the local environment, we use localhost and the mapped port
+        hostname = "localhost"
+        port = server_config.get(
+            "ssh_port", 2222
+        )  # Use ssh_port if set, or default to 2222
+        params = (
+            hostname,
+            port,
+            server_config["username"],
+            server_config["password"],
+        )
+        return params, None
+
+    def _execute_batch(self, client, server_name: str, commands: List[str]):
+        """Runs all commands in one exec and returns (JSON with one result per
+        command, True when every command finished with exit code 0)."""
+        # Cada comando tem o mesmo limite de uma execução isolada
+        command_timeout = 8
+
+        logger.info(f"Executando {len(commands)} comandos em lote: {commands}")
+        nonce = new_nonce()
+        script = build_batch_script(commands, nonce, command_timeout)
+
+        start = time.perf_counter()
+        stdin, stdout, stderr = client.exec_command(script, get_pty=False)
+        channel = stdout.channel
+        out_buffer, err_buffer = CappedBuffer(), CappedBuffer()
+        try:
+            _, stopped = read_channel(
+                channel,
+                out_buffer,
+                err_buffer,
+                command_timeout * len(commands) + 2,
+            )
+        finally:
+            channel.close()
+
+        results = parse_batch_output(
+            commands, out_buffer.text(), err_buffer.text(), nonce
+        )
+        # O orçamento de saída vale para cada comando do lote
+        for result in results:
+            for stream in ("stdout", "stderr"):
+                result[stream], omitted = truncate_text(result[stream])
+                if omitted:
+                    SSH_OUTPUT_TRUNCATED_BYTES.labels(server_name, stream).inc(omitted)
+
+        document = {
+            "server": server_name,
+            "total_duration_ms": round((time.perf_counter() - start) * 1000, 1),
+            "results": results,
+        }
+        if stopped:
+            document["stopped"] = stopped
+        ok = not stopped and all(
+            r.get("exit_code") == 0 and not r.get("timed_out") and not r.get("error")
+            for r in results
+        )
+        return json.dumps(document, ensure_ascii=False, indent=2), ok
+
+    def _execute(self, client, server_name: str, command: str):
+        """Runs one command on an open connection and returns (formatted
+        output, True when it finished with exit code 0)."""
+        # Timeout rigoroso para evitar bloqueios
+        command_timeout = 8  # 8 segundos para comandos
+
+        logger.info(f"Executando comando: {command}")
+
+        # Executar comando com timeout explícito
+        stdin, stdout, stderr = client.exec_command(
+            command,
+            timeout=command_timeout,
+            # Não alocar um PTY, que pode causar bloqueios
+            get_pty=False,
+        )
+
+        # Leitura incremental dos dois fluxos: só o início e o fim de saídas
+        # grandes são mantidos, e a saída parcial sobrevive a um timeout
+        channel = stdout.channel
+        out_buffer, err_buffer = HeadTailBuffer(), HeadTailBuffer()
+        try:
+            exit_status, stopped = read_channel(
+                channel, out_buffer, err_buffer, command_timeout
+            )
+        finally:
+            # Fechar o canal com segurança (a conexão volta para o pool)
+            try:
+                channel.close()
+            except Exception:
+                pass
+
+        output, out_omitted = out_buffer.result()
+        errors, err_omitted = err_buffer.result()
+        if out_omitted:
+            SSH_OUTPUT_TRUNCATED_BYTES.labels(server_name, "stdout").inc(out_omitted)
+        if err_omitted:
+            SSH_OUTPUT_TRUNCATED_BYTES.labels(server_name, "stderr").inc(err_omitted)
+
+        if stopped == "timeout":
+            errors += f"\n[Timeout: comando interrompido após {command_timeout}s, saída parcial]"
+        elif stopped == "too_large":
+            errors += "\n[Saída grande demais: leitura interrompida, saída parcial]"
+        if exit_status not in (None, 0):
+            errors += f"\n[Comando retornou código de erro: {exit_status}]"
+
+        # Processar resultado e retornar
+        result = output
+        if errors and not errors.isspace() and errors.strip():
+            result += f"\nErros: {errors}"
+
+        return result, stopped is None and exit_status == 0
@@ -0,0 +1,144 @@
+"""Bounded reading of SSH command output.
+
+Commands such as `lsof -p`, `ps aux` or a `cat` of a log file can print
+megabytes, and all of it used to end up in the LLM context. Output is now read
+incrementally from both streams, and only the first and last part of each
+stream is kept (byte and line budgets), joined by a marker that says how much
+was left out. The whole read is bounded by a deadline, so a slow command still
+returns its partial output.
+"""
+
+import os
+import time
+
+SSH_OUTPUT_MAX_BYTES = int(os.getenv("SSH_OUTPUT_MAX_BYTES", "16384"))
+SSH_OUTPUT_MAX_LINES = int(os.getenv("SSH_OUTPUT_MAX_LINES", "200"))
+# Hard limit on what is read from one channel; after it the command is abandoned
+SSH_READ_MAX_BYTES = int(os.getenv("SSH_READ_MAX_BYTES", str(8 * 1024 * 1024)))
+
+READ_CHUNK = 32768
+POLL_INTERVAL = 0.01
+
+
+def elision_marker(omitted_bytes, omitted_lines):
+    return f"\n[... {omitted_bytes} bytes ({omitted_lines} lines) omitted ...]\n"
+
+
+class HeadTailBuffer:
+    """Keeps the first and last bytes of a stream within a fixed budget."""
+
+    def __init__(self, max_bytes=SSH_OUTPUT_MAX_BYTES, max_lines=SSH_OUTPUT_MAX_LINES):
+        self.max_bytes = max_bytes
+        self.max_lines = max_lines
+        self.head_limit = max_bytes // 2
+        self.tail_limit = max_bytes - self.head_limit
+        self.head = bytearray()
+        self.tail = bytearray()
+        self.total = 0
+        self.newlines = 0
+
+    def feed(self, data):
+        self.total += len(data)
+        self.newlines += data.count(b"\n")
+        room = self.head_limit - len(self.head)
+        if room > 0:
+            self.head += data[:room]
+            data = data[room:]
+        if data:
+            self.tail += data
+            # Trimmed in batches to avoid shifting the buffer on every chunk
+            if len(self.tail) > 2 * self.tail_limit:
+                del self.tail[: -self.tail_limit]
+
+    def result(self):
+        """Return (text, omitted bytes)."""
+        half = self.max_lines // 2
+        if self.total <= self.max_bytes:
+            data = bytes(self.head + self.tail)
+            lines = data.splitlines(keepends=True)
+            if len(lines) <= self.max_lines:
+                return data.decode("utf-8", errors="replace"), 0
+            head_lines = lines[:half]
+            tail_lines = lines[len(lines) - (self.max_lines - half) :]
+        else:
+            head_lines = bytes(self.head).splitlines(keepends=True)[:half]
+            tail_lines = bytes(self.tail[-self.tail_limit :]).splitlines(keepends=True)
+            # The first tail line starts mid-line
+            if len(tail_lines) > 1:
+                tail_lines = tail_lines[1:]
+            tail_lines = tail_lines[-(self.max_lines - half) :]
+
+        head = b"".join(head_lines)
+        tail = b"".join(tail_lines)
+        omitted = self.total - len(head) - len(tail)
+        omitted_lines = self.newlines - head.count(b"\n") - tail.count(b"\n")
+        text = (
+            head.decode("utf-8", errors="replace")
+            + elision_marker(omitted, omitted_lines)
+            + tail.decode("utf-8", errors="replace")
+        )
+        return text, omitted
+
+
+class CappedBuffer:
+    """Keeps everything up to max_bytes (for output parsed afterwards)."""
+
+    def __init__(self, max_bytes=SSH_READ_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.data = bytearray()
+        self.total = 0
+
+    def feed(self, data):
+        self.total += len(data)
+        room = self.max_bytes - len(self.data)
+        if room > 0:
+            self.data += data[:room]
+
+    def text(self):
+        return self.data.decode("utf-8", errors="replace")
+
+
+def truncate_text(text, max_bytes=SSH_OUTPUT_MAX_BYTES, max_lines=SSH_OUTPUT_MAX_LINES):
+    """Apply the head+tail budget to text already in memory."""
+    buffer = HeadTailBuffer(max_bytes, max_lines)
+    buffer.feed(text.encode("utf-8", errors="replace"))
+    return buffer.result()
+
+
+def read_channel(channel, stdout, stderr, timeout, max_read_bytes=SSH_READ_MAX_BYTES):
+    """Read both streams of an exec channel into the given buffers.
+
+    Both streams are drained as data arrives, so a chatty stderr cannot stall
+    the channel window. Returns (exit status or None, reason the read stopped
+    early or None: "timeout" or "too_large").
+    """
+    deadline = time.monotonic() + timeout
+    read_bytes = 0
+    while True:
+        progressed = False
+        if channel.recv_ready():
+            data = channel.recv(READ_CHUNK)
+            stdout.feed(data)
+            read_bytes += len(data)
+            progressed = True
+        if channel.recv_stderr_ready():
+            data = channel.recv_stderr(READ_CHUNK)
+            stderr.feed(data)
+            read_bytes += len(data)
+            progressed = True
+
+        if read_bytes > max_read_bytes:
+            return None, "too_large"
+        if not progressed and (channel.exit_status_ready() or channel.closed):
+            # Data may still arrive right after the exit status
+            if not channel.recv_ready() and not channel.recv_stderr_ready():
+                break
+        if time.monotonic() >= deadline:
+            # EOF without exit status (e.g. killed session) is not a timeout
+            return None, None if channel.eof_received else "timeout"
+        if not progressed:
+            time.sleep(POLL_INTERVAL)
+
+    if channel.exit_status_ready():
+        return channel.recv_exit_status(), None
+    return None, None
@@ -0,0 +1,228 @@
+"""Pool of authenticated SSH connections shared by the SSH tools.
+
+Opening a connection (TCP, key exchange and password auth) costs far more than
+running a diagnostic command, especially on a CPU-saturated target. The pool
+keeps a few idle authenticated connections per server, with transport
+keepalives, a health check before reuse and eviction after SSH_POOL_IDLE_TIMEOUT
+seconds without use.
+
+The servers configuration is cached and reloaded only when the file changes.
+Connections opened with outdated settings are discarded on their next use.
+"""
+
+import logging
+import os
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+import paramiko
+import yaml
+from tools.tool_metrics import (
+    SSH_CONNECT_DURATION,
+    SSH_POOL_EVENTS,
+    SSH_POOL_IDLE,
+)
+
+logger = logging.getLogger(__name__)
+
+SSH_CONNECT_TIMEOUT = float(os.getenv("SSH_CONNECT_TIMEOUT", "5"))
+SSH_POOL_MAX_IDLE = int(os.getenv("SSH_POOL_MAX_IDLE", "4"))
+SSH_POOL_IDLE_TIMEOUT = float(os.getenv("SSH_POOL_IDLE_TIMEOUT", "300"))
+SSH_KEEPALIVE_INTERVAL = int(os.getenv("SSH_KEEPALIVE_INTERVAL", "15"))
+# Connections idle for longer than this are probed before being reused
+SSH_HEALTH_CHECK_AFTER = float(os.getenv("SSH_HEALTH_CHECK_AFTER", "30"))
+
+# Adjust the paths as needed for the local environment
+CONFIG_PATHS = [
+    "./config/servers.yaml",
+    "/home/manoel/v2_multi_agent_it_support/services/it-support-crew/config/servers.yaml",
+]
+
+_config_lock = threading.Lock()
+_config_cache = {"path": None, "mtime": None, "config": None}
+
+
+def load_servers_config():
+    """Return the parsed servers.yaml, or None if no configuration file exists.
+
+    The file is parsed again only when its path or modification time changes.
+    """
+    config_path = next((p for p in CONFIG_PATHS if os.path.exists(p)), None)
+    if config_path is None:
+        return None
+
+    mtime = os.stat(config_path).st_mtime_ns
+    with _config_lock:
+        if _config_cache["path"] != config_path or _config_cache["mtime"] != mtime:
+            with open(config_path, "r") as file:
+                _config_cache["config"] = yaml.safe_load(file) or {}
+            _config_cache["path"] = config_path
+            _config_cache["mtime"] = mtime
+            logger.info(f"Loaded server configuration from {config_path}")
+        return _config_cache["config"]
+
+
+class PooledConnection:
+    """An authenticated SSH client and the settings it was opened with."""
+
+    def __init__(self, client, params):
+        self.client = client
+        self.params = params
+        self.created_at = time.monotonic()
+        self.last_used = self.created_at
+
+    def close(self):
+        try:
+            self.client.close()
+        except Exception:
+            pass
+
+
+class SSHConnectionPool:
+    """Thread-safe pool of idle SSH connections, per server.
+
+    A connection is used by one caller at a time; concurrent callers open
+    extra connections, and at most `max_idle` of them are kept afterwards.
+    """
+
+    def __init__(
+        self,
+        max_idle=SSH_POOL_MAX_IDLE,
+        idle_timeout=SSH_POOL_IDLE_TIMEOUT,
+        keepalive=SSH_KEEPALIVE_INTERVAL,
+    ):
+        self.max_idle = max_idle
+        self.idle_timeout = idle_timeout
+        self.keepalive = keepalive
+        self._lock = threading.Lock()
+        self._idle = defaultdict(list)
+        self._reaper = None
+
+    def _connect(self, server_name, params):
+        hostname, port, username, password = params
+        logger.info(f"Connecting via SSH to {hostname}:{port} with user {username}")
+        start = time.perf_counter()
+        client = paramiko.SSHClient()
+        client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+        client.connect(
+            hostname,
+            port=port,
+            username=username,
+            password=password,
+            timeout=SSH_CONNECT_TIMEOUT,
+            banner_timeout=SSH_CONNECT_TIMEOUT,
+            auth_timeout=SSH_CONNECT_TIMEOUT,
+        )
+        client.get_transport().set_keepalive(self.keepalive)
+        SSH_CONNECT_DURATION.labels(server_name).observe(time.perf_counter() - start)
+        SSH_POOL_EVENTS.labels(server_name, "created").inc()
+        return PooledConnection(client, params)
+
+    def _check(self, conn, params, now):
+        """Return None if the connection can be reused, else the eviction reason."""
+        if conn.params != params:
+            return "config_changed"
+        if now - conn.last_used > self.idle_timeout:
+            return "idle"
+        transport = conn.client.get_transport()
+        if transport is None or not transport.is_active():
+            return "unhealthy"
+        if now - conn.last_used > SSH_HEALTH_CHECK_AFTER:
+            try:
+                transport.send_ignore()
+            except Exception:
+                return "unhealthy"
+        return None
+
+    def acquire(self, server_name, params):
+        """Return a healthy connection for the server, opening one if needed."""
+        self._start_reaper()
+        stale = []
+        conn = None
+        with self._lock:
+            idle = self._idle[server_name]
+            now = time.monotonic()
+            while idle:
+                candidate = idle.pop()
+                reason = self._check(candidate, params, now)
+                if reason is None:
+                    conn = candidate
+                    break
+                stale.append((candidate, reason))
+            SSH_POOL_IDLE.labels(server_name).set(len(idle))
+
+        for candidate, reason in stale:
+            SSH_POOL_EVENTS.labels(server_name, f"evicted_{reason}").inc()
+            candidate.close()
+
+        if conn is not None:
+            SSH_POOL_EVENTS.labels(server_name, "reused").inc()
+            return conn
+        return self._connect(server_name, params)
+
+    def release(self, server_name, conn, reusable=True):
+        """Return a connection to the pool, or close it if it is not reusable."""
+        if reusable:
+            conn.last_used = time.monotonic()
+            with self._lock:
+                idle = self._idle[server_name]
+                if len(idle) < self.max_idle:
+                    idle.append(conn)
+                    SSH_POOL_IDLE.labels(server_name).set(len(idle))
+                    return
+
+        SSH_POOL_EVENTS.labels(server_name, "discarded").inc()
+        conn.close()
+
+    @contextmanager
+    def connection(self, server_name, params):
+        """Borrow a connection; it is discarded if the block raises."""
+        conn = self.acquire(server_name, params)
+        try:
+            yield conn.client
+        except Exception:
+            self.release(server_name, conn, reusable=False)
+            raise
+        self.release(server_name, conn)
+
+    def evict_idle(self):
+        """Close connections idle for longer than idle_timeout."""
+        expired = []
+        with self._lock:
+            now = time.monotonic()
+            for server_name, idle in self._idle.items():
+                keep = [c for c in idle if now - c.last_used <= self.idle_timeout]
+                expired.extend((server_name, c) for c in idle if c not in keep)
+                idle[:] = keep
+                SSH_POOL_IDLE.labels(server_name).set(len(keep))
+
+        for server_name, conn in expired:
+            SSH_POOL_EVENTS.labels(server_name, "evicted_idle").inc()
+            conn.close()
+
+    def close_all(self):
+        with self._lock:
+            conns = [c for idle in self._idle.values() for c in idle]
+            self._idle.clear()
+        for conn in conns:
+            conn.close()
+
+    def _start_reaper(self):
+        if self._reaper is not None:
+            return
+        with self._lock:
+            if self._reaper is None:
+                self._reaper = threading.Thread(
+                    target=self._reap, name="ssh-pool-reaper", daemon=True
+                )
+                self._reaper.start()
+
+    def _reap(self):
+        while True:
+            time.sleep(max(1.0, self.idle_timeout / 2))
+            self.evict_idle()
+
+
+ssh_pool = SSHConnectionPool()
@@ -0,0 +1,57 @@
+"""Prometheus metrics shared by the crew tools.
+
+The crew runs as a single process, so the metrics live in the default registry
+and are exposed by the /metrics endpoint of crew.py.
+"""
+
+from prometheus_client import Counter, Gauge, Histogram
+
+SSH_CONNECT_DURATION = Histogram(
+    "ssh_connect_duration_seconds",
+    "Time to open and authenticate a new SSH connection",
+    ["server"],
+    buckets=(0.05, 0.1, 0.25, 0.5, 1, 2, 5, 10),
+)
+
+SSH_EXEC_DURATION = Histogram(
+    "ssh_exec_duration_seconds",
+    "Time to run a command over SSH and read its output",
+    ["server"],
+    buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1, 2, 5, 10),
+)
+
+SSH_POOL_EVENTS = Counter(
+    "ssh_pool_events_total",
+    "SSH connection pool events (created, reused, evicted, discarded)",
+    ["server", "event"],
+)
+
+SSH_POOL_IDLE = Gauge(
+    "ssh_pool_idle_connections",
+    "Idle authenticated SSH connections kept in the pool",
+    ["server"],
+)
+
+SSH_OUTPUT_TRUNCATED_BYTES = Counter(
+    "ssh_output_truncated_bytes_total",
+    "Bytes of SSH command output left out of tool results",
+    ["server", "stream"],
+)
+
+TOOL_CACHE_LOOKUPS = Counter(
+    "tool_cache_lookups_total",
+    "Run-scoped tool result cache lookups (hit, miss, bypass)",
+    ["tool", "result"],
+)
+
+EVIDENCE_COLLECTION_DURATION = Histogram(
+    "evidence_collection_duration_seconds",
+    "Time to collect the evidence attached to an alert before the crew runs",
+    buckets=(0.5, 1, 2, 5, 10, 20, 30),
+)
+
+EVIDENCE_ITEMS = Counter(
+    "evidence_items_total",
+    "Evidence items collected before a crew run (ok, error, timeout)",
+    ["status"],
+)
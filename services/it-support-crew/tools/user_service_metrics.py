@@ -1,20 +1,54 @@
-import json
 import logging
-from typing import Any, Dict, Optional, Type
+import os
+import re
+import time
+from typing import Optional, Type
 
-import requests
 from crewai.tools import BaseTool
 from pydantic import BaseModel, Field
+from tools.exposition import (
+    parse_label_filter,
+    sample_total,
+    scrape_history,
+    summarize_exposition,
+)
+from tools.http_client import fetch_all
+from tools.run_cache import run_cache
 
 logger = logging.getLogger(__name__)
 
+# Overall time limit for the requests of one call
+METRICS_TOOL_DEADLINE = float(os.getenv("METRICS_TOOL_DEADLINE", "10"))
+
+# Results are reused within a crew run for this many seconds
+METRICS_CACHE_TTL = float(os.getenv("METRICS_CACHE_TTL", "15"))
+
+# Requests made for each endpoint option
+ENDPOINT_FETCHES = {
+    "metrics": ("health", "metrics"),
+    "health": ("health",),
+    "alerts": ("alerts",),
+    "all": ("health", "alerts", "metrics"),
+}
+
+# Application metrics shown when no filter is given
+DEFAULT_METRICS_FILTER = "^(http_|database_|redis_|rabbitmq_|sql_alchemy_|login_|password_|user_cache_|auth_)"
+
 
 class UserServiceMetricsToolInput(BaseModel):
     """Input schema for the UserServiceMetricsTool."""
 
     endpoint: str = Field(
         default="metrics",
-        description="Endpoint to query: 'metrics', 'health', or 'alerts'. Defaults to metrics.",
+        description="Endpoint to query: 'metrics', 'health', 'alerts', or 'all' (health, alerts and metrics together). Defaults to metrics.",
+    )
+    metrics: Optional[str] = Field(
+        None,
+        description="Optional regex on metric names, e.g. 'http_request_duration|database_'. Defaults to the main application metrics.",
+    )
+    labels: Optional[str] = Field(
+        None,
+        description="Optional label filter, e.g. 'endpoint=/users,status=500' or 'status=~5..'",
     )
 
 
@@ -27,161 +61,198 @@ class UserServiceMetricsTool(BaseTool):
     2. Check the service health status
     3. Analyze database connections and other critical indicators
     4. Retrieve current alerts from Prometheus
+    Use endpoint='all' to get health, alerts and metrics in one call.
+
+    Metrics are returned as a table with one row per series: counters with
+    their rate per second since the previous call, gauges with their value and
+    histograms (latencies) with count, average and p50/p95/p99.
+    Filter with metrics (regex on the name) and labels ('status=500').
     """
     args_schema: Type[BaseModel] = UserServiceMetricsToolInput
 
-    def _run(self, endpoint: str = "metrics") -> str:
+    def _run(
+        self,
+        endpoint: str = "metrics",
+        metrics: Optional[str] = None,
+        labels: Optional[str] = None,
+    ) -> str:
         """
         Executes the metrics collection tool for the user-service.
 
         Args:
-            endpoint (str): The endpoint to query: 'metrics', 'health', or 'alerts'.
-                         Default is 'metrics'.
+            endpoint (str): The endpoint to query: 'metrics', 'health', 'alerts',
+                         or 'all'. Default is 'metrics'.
+            metrics (str, optional): Regex on metric names.
+            labels (str, optional): Label filter such as 'status=500'.
 
         Returns:
             str: Formatted metrics collection result
         """
-        try:
-            # Update URL to access the service exposed on the host port
-            metrics_url = "http://localhost:5001/metrics"
-            health_url = "http://localhost:5001/health"
-            alerts_url = "http://localhost:9090/api/v1/alerts"
-
-            logger.info(f"Collecting metrics from user-service")
-
-            # If alerts endpoint was requested
-            if endpoint.lower() == "alerts":
-                return self._get_prometheus_alerts(alerts_url)
-
-            # Health check
-            health_response = requests.get(health_url, timeout=10)
-
-            if health_response.status_code != 200:
-                health_data = (
-                    f"ALERT: Service reported unhealthy status: {health_response.text}"
+        # Update URL to access the service exposed on the host port
+        urls = {
+            "health": "http://localhost:5001/health",
+            "metrics": "http://localhost:5001/metrics",
+            "alerts": "http://localhost:9090/api/v1/alerts",
+        }
+        selected = ENDPOINT_FETCHES.get(endpoint.lower(), ENDPOINT_FETCHES["metrics"])
+
+        key = (selected, metrics, labels)
+        cached = run_cache.get(self.name, key)
+        if cached is not None:
+            result, age = cached
+            return f"[Cached result from {age:.0f}s ago]\n{result}"
+
+        logger.info(f"Collecting {', '.join(selected)} from user-service")
+
+        # Requests run concurrently and share one deadline
+        responses = fetch_all(
+            {name: urls[name] for name in selected}, METRICS_TOOL_DEADLINE
+        )
+
+        sections = []
+        if "health" in responses:
+            sections.append(self._format_health(responses["health"]))
+        if "alerts" in responses:
+            sections.append(self._format_alerts(responses["alerts"]))
+        if "metrics" in responses:
+            sections.append(
+                self._format_metrics(
+                    responses["metrics"], urls["metrics"], metrics, labels
                 )
-            else:
-                health_data = f"Health status: {health_response.json()}"
-
-            # If only the health endpoint was requested
-            if endpoint.lower() == "health":
-                return health_data
-
-            # Metrics query
-            metrics_response = requests.get(metrics_url, timeout=10)
-
-            if metrics_response.status_code != 200:
-                return f"Error collecting metrics: {metrics_response.status_code}\n{health_data}"
-
-            metrics_raw = metrics_response.text
-
-            # Basic processing to make the output more readable
-            processed_output = self._process_metrics(metrics_raw)
-
-            return f"{health_data}\n\n{processed_output}"
-
-        except requests.exceptions.RequestException as e:
-            logger.error(f"Error collecting metrics: {str(e)}")
-            return f"Error connecting to metrics service: {str(e)}"
-
-    def _get_prometheus_alerts(self, alerts_url: str) -> str:
+            )
+        result = "\n\n".join(sections)
+        # Failed requests are retried on the next call
+        if not any(isinstance(r, Exception) for r in responses.values()):
+            run_cache.put(self.name, key, result, METRICS_CACHE_TTL)
+        return result
+
+    def _format_health(self, response) -> str:
+        if isinstance(response, Exception):
+            logger.error(f"Error checking health: {str(response)}")
+            return f"Error connecting to metrics service: {str(response)}"
+
+        if response.status_code != 200:
+            return f"ALERT: Service reported unhealthy status: {response.text}"
+        try:
+            return f"Health status: {response.json()}"
+        except ValueError:
+            return f"Health status: {response.text}"
+
+    def _format_metrics(
+        self,
+        response,
+        source: str,
+        metrics: Optional[str] = None,
+        labels: Optional[str] = None,
+    ) -> str:
+        if isinstance(response, Exception):
+            logger.error(f"Error collecting metrics: {str(response)}")
+            return f"Error connecting to metrics service: {str(response)}"
+
+        if response.status_code != 200:
+            return f"Error collecting metrics: {response.status_code}"
+
+        # Basic processing to make the output more readable
+        return self._process_metrics(response.text, source, metrics, labels)
+
+    def _format_alerts(self, response) -> str:
         """
-        Retrieves and formats current alerts from Prometheus.
+        Formats the current alerts returned by the Prometheus alerts API.
 
         Args:
-            alerts_url (str): URL for the Prometheus alerts API endpoint
+            response: Response of the alerts endpoint, or the request error
 
         Returns:
             str: Formatted alert information
         """
-        try:
-            response = requests.get(alerts_url, timeout=10)
+        if isinstance(response, Exception):
+            logger.error(f"Error retrieving Prometheus alerts: {str(response)}")
+            return f"Error connecting to Prometheus: {str(response)}"
 
-            if response.status_code != 200:
-                return f"Error retrieving alerts: HTTP {response.status_code}"
+        if response.status_code != 200:
+            return f"Error retrieving alerts: HTTP {response.status_code}"
 
+        try:
             alerts_data = response.json()
+        except ValueError:
+            return f"Error retrieving alerts: invalid response: {response.text[:200]}"
+
+        # Any JSON is accepted by response.json(); only the documented shape is used
+        data = alerts_data.get("data") if isinstance(alerts_data, dict) else None
+        active_alerts = data.get("alerts") if isinstance(data, dict) else None
+        if not isinstance(active_alerts, list):
+            return (
+                f"Error retrieving alerts: unexpected response: {response.text[:200]}"
+            )
 
-            if not alerts_data.get("data", {}).get("alerts", []):
-                return "No active alerts found in Prometheus."
-
-            active_alerts = alerts_data.get("data", {}).get("alerts", [])
-            formatted_alerts = "Current Prometheus Alerts:\n\n"
-
-            for idx, alert in enumerate(active_alerts, 1):
-                alert_name = alert.get("labels", {}).get("alertname", "Unnamed Alert")
-                severity = alert.get("labels", {}).get("severity", "unknown")
-                status = alert.get("state", "unknown")
-                summary = alert.get("annotations", {}).get(
-                    "summary", "No summary available"
-                )
-                description = alert.get("annotations", {}).get(
-                    "description", "No description available"
-                )
-
-                formatted_alerts += f"Alert #{idx}: {alert_name}\n"
-                formatted_alerts += f"Status: {status}\n"
-                formatted_alerts += f"Severity: {severity}\n"
-                formatted_alerts += f"Summary: {summary}\n"
-                formatted_alerts += f"Description: {description}\n\n"
+        active_alerts = [alert for alert in active_alerts if isinstance(alert, dict)]
+        if not active_alerts:
+            return "No active alerts found in Prometheus."
 
-            return formatted_alerts
+        formatted_alerts = "Current Prometheus Alerts:\n\n"
 
-        except requests.exceptions.RequestException as e:
-            logger.error(f"Error retrieving Prometheus alerts: {str(e)}")
-            return f"Error connecting to Prometheus: {str(e)}"
+        for idx, alert in enumerate(active_alerts, 1):
+            alert_name = alert.get("labels", {}).get("alertname", "Unnamed Alert")
+            severity = alert.get("labels", {}).get("severity", "unknown")
+            status = alert.get("state", "unknown")
+            summary = alert.get("annotations", {}).get(
+                "summary", "No summary available"
+            )
+            description = alert.get("annotations", {}).get(
+                "description", "No description available"
+            )
 
-    def _process_metrics(self, metrics_text: str) -> str:
+            formatted_alerts += f"Alert #{idx}: {alert_name}\n"
+            formatted_alerts += f"Status: {status}\n"
+            formatted_alerts += f"Severity: {severity}\n"
+            formatted_alerts += f"Summary: {summary}\n"
+            formatted_alerts += f"Description: {description}\n\n"
+
+        return formatted_alerts
+
+    def _process_metrics(
+        self,
+        metrics_text: str,
+        source: str,
+        metrics: Optional[str] = None,
+        labels: Optional[str] = None,
+    ) -> str:
         """
-        Processes the raw metrics text to make it more readable.
+        Summarizes the raw exposition into a compact table, one row per series.
         """
-        processed_lines = []
-
-        # Important metrics to highlight
-        key_metrics = [
-            "http_requests_total",
-            "http_request_duration_seconds",
-            "database_health",
-            "redis_health",
-            "http_requests_in_progress",
-            "sql_alchemy_pool_connections",
-            "database_error_total",
-            "database_query_duration_seconds",
-        ]
-
-        lines = metrics_text.split("\n")
-
-        for line in lines:
-            line = line.strip()
-            if not line or line.startswith("#"):
-                continue
-
-            # Highlight important metrics
-            for key in key_metrics:
-                if key in line and not line.startswith("#"):
-                    processed_lines.append(f"[IMPORTANT] {line}")
-                    break
-            else:
-                processed_lines.append(line)
+        name_filter = metrics or DEFAULT_METRICS_FILTER
+        # Filters are checked first so a malformed exposition is not reported
+        # as a bad filter
+        try:
+            re.compile(name_filter)
+            parse_label_filter(labels)
+        except (ValueError, re.error) as e:
+            return f"Error: invalid filter: {e}"
+
+        previous = scrape_history.previous(source)
+        now = time.monotonic()
+        try:
+            table, samples = summarize_exposition(
+                metrics_text,
+                name_filter=name_filter,
+                label_filter=labels,
+                previous=previous,
+                now=now,
+            )
+        except ValueError as e:
+            logger.error(f"Error parsing metrics from {source}: {str(e)}")
+            return f"Error: could not parse the metrics exposition from {source}: {e}"
+        scrape_history.update(source, samples, now)
+
+        processed = [table]
+        if not previous:
+            processed.append(
+                "(rates and interval quantiles are available from the next call)"
+            )
 
         # Analyze pool connections
-        connections_used = None
-        connections_total = None
-
-        for line in lines:
-            if "sql_alchemy_pool_connections_used" in line and not line.startswith("#"):
-                try:
-                    connections_used = float(line.split()[1])
-                except (ValueError, IndexError):
-                    pass
-
-            if "sql_alchemy_pool_connections_total" in line and not line.startswith(
-                "#"
-            ):
-                try:
-                    connections_total = float(line.split()[1])
-                except (ValueError, IndexError):
-                    pass
+        connections_used = sample_total(samples, "sql_alchemy_pool_connections_used")
+        connections_total = sample_total(samples, "sql_alchemy_pool_connections_total")
 
         if connections_used is not None and connections_total is not None:
             usage_percent = (
@@ -197,6 +268,6 @@ class UserServiceMetricsTool(BaseTool):
             if usage_percent > 80:
                 pool_status += "- ALERT: Connection pool close to limit!\n"
 
-            processed_lines.append(pool_status)
+            processed.append(pool_status)
 
-        return "\n".join(processed_lines)
+        return "\n".join(processed)
@@ -0,0 +1,144 @@
+"""Hash de senhas (PBKDF2-SHA256) executado em um pool de processos limitado.
+
+O cálculo do hash é CPU-bound e, executado nas threads do Flask, seguraria o
+GIL e bloquearia as demais requisições. As funções de hash rodam em processos
+separados; o número de operações pendentes é limitado para que rajadas de login
+não acumulem uma fila sem fim.
+"""
+
+import base64
+import hashlib
+import hmac
+import multiprocessing
+import os
+import secrets
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+
+ALGORITHM = "pbkdf2_sha256"
+SALT_BYTES = 16
+
+# Custo ajustável: hashes com menos iterações são refeitos no próximo login
+PASSWORD_HASH_ITERATIONS = int(os.getenv("PASSWORD_HASH_ITERATIONS", "200000"))
+PASSWORD_HASH_WORKERS = int(
+    os.getenv("PASSWORD_HASH_WORKERS", str(min(4, os.cpu_count() or 1)))
+)
+PASSWORD_HASH_MAX_PENDING = int(
+    os.getenv("PASSWORD_HASH_MAX_PENDING", str(PASSWORD_HASH_WORKERS * 8))
+)
+PASSWORD_HASH_TIMEOUT = float(os.getenv("PASSWORD_HASH_TIMEOUT", "5"))
+
+
+class PasswordHasherBusy(Exception):
+    """O pool de hash atingiu o limite de operações pendentes ou o timeout."""
+
+
+def _b64encode(data):
+    return base64.b64encode(data).decode("ascii").rstrip("=")
+
+
+def _b64decode(data):
+    return base64.b64decode(data + "=" * (-len(data) % 4))
+
+
+def _pbkdf2(password, salt, iterations):
+    return hashlib.pbkdf2_hmac("sha256", password.encode("utf-8"), salt, iterations)
+
+
+# Hash fixo verificado quando o usuário não existe, para que o login de um
+# usuário inexistente leve o mesmo tempo que o de uma senha errada
+DUMMY_HASH = (
+    f"{ALGORITHM}${PASSWORD_HASH_ITERATIONS}"
+    f"${_b64encode(bytes(SALT_BYTES))}${_b64encode(bytes(32))}"
+)
+
+
+def is_hashed(stored):
+    """Indica se o valor armazenado já está no formato de hash."""
+    return stored.startswith(ALGORITHM + "$")
+
+
+def hash_password(password, iterations=None):
+    """Gera o hash da senha. Retorna (valor codificado, duração em segundos)."""
+    start = time.perf_counter()
+    iterations = iterations or PASSWORD_HASH_ITERATIONS
+    salt = secrets.token_bytes(SALT_BYTES)
+    digest = _pbkdf2(password, salt, iterations)
+    encoded = f"{ALGORITHM}${iterations}${_b64encode(salt)}${_b64encode(digest)}"
+    return encoded, time.perf_counter() - start
+
+
+def verify_password(password, stored):
+    """Verifica a senha contra o valor armazenado.
+
+    Valores legados em texto puro também são aceitos. Retorna (válida,
+    precisa_rehash, duração em segundos); precisa_rehash indica texto puro ou
+    custo abaixo do configurado.
+    """
+    start = time.perf_counter()
+    if not is_hashed(stored):
+        valid = hmac.compare_digest(password.encode("utf-8"), stored.encode("utf-8"))
+        return valid, valid, time.perf_counter() - start
+
+    try:
+        _, iterations, salt, expected = stored.split("$")
+        iterations = int(iterations)
+        digest = _pbkdf2(password, _b64decode(salt), iterations)
+        valid = hmac.compare_digest(digest, _b64decode(expected))
+    except ValueError:
+        return False, False, time.perf_counter() - start
+
+    needs_rehash = valid and iterations < PASSWORD_HASH_ITERATIONS
+    return valid, needs_rehash, time.perf_counter() - start
+
+
+# ================== Pool de processos ==================
+_executor = None
+_executor_lock = threading.Lock()
+_slots = threading.BoundedSemaphore(PASSWORD_HASH_MAX_PENDING)
+
+
+def get_executor():
+    """Retorna o pool de processos, criando-o no primeiro uso.
+
+    Usa forkserver (fork de um processo com várias threads não é seguro),
+    pré-carregando este módulo nos workers. Cada worker também reimporta o
+    script principal como __mp_main__; por isso o serviço é iniciado por
+    serve.py, que não carrega a aplicação quando importado.
+    """
+    global _executor
+
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                context = multiprocessing.get_context("forkserver")
+                context.set_forkserver_preload([__name__])
+                _executor = ProcessPoolExecutor(
+                    max_workers=PASSWORD_HASH_WORKERS, mp_context=context
+                )
+    return _executor
+
+
+def run_in_pool(func, *args):
+    """Executa func no pool, respeitando o limite de operações pendentes.
+
+    Levanta PasswordHasherBusy se não houver vaga ou se o resultado não vier
+    dentro do timeout.
+    """
+    if not _slots.acquire(timeout=PASSWORD_HASH_TIMEOUT):
+        raise PasswordHasherBusy("Password hashing pool is saturated")
+    try:
+        future = get_executor().submit(func, *args)
+    except Exception:
+        _slots.release()
+        raise
+
+    # A vaga só é devolvida quando o hash termina no pool, mesmo que quem pediu
+    # já tenha desistido por timeout
+    future.add_done_callback(lambda _: _slots.release())
+    try:
+        return future.result(timeout=PASSWORD_HASH_TIMEOUT)
+    except FutureTimeoutError:
+        raise PasswordHasherBusy("Password hashing timed out")
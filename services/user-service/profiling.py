@@ -0,0 +1,238 @@
+"""Diagnóstico sob demanda de CPU e memória do processo.
+
+Profiler por amostragem: sem perfil em andamento o custo é zero, pois não há
+hooks de trace nem threads extras. Durante a coleta, a própria thread da
+requisição lê sys._current_frames() na taxa pedida e conta as pilhas no formato
+"collapsed" (uma linha "frame;frame;... contagem"), aceito por flamegraph.pl e
+speedscope.
+
+Heap: o tracemalloc só é ligado sob demanda e desligado sozinho após
+HEAP_TRACE_MAX_SECONDS; no máximo HEAP_MAX_SNAPSHOTS snapshots ficam em memória.
+"""
+
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter, OrderedDict
+
+PROFILE_DEFAULT_SECONDS = float(os.getenv("PROFILE_DEFAULT_SECONDS", "10"))
+PROFILE_MAX_SECONDS = float(os.getenv("PROFILE_MAX_SECONDS", "60"))
+PROFILE_DEFAULT_RATE = int(os.getenv("PROFILE_DEFAULT_RATE", "100"))
+PROFILE_MAX_RATE = int(os.getenv("PROFILE_MAX_RATE", "1000"))
+
+# Funções em que threads ociosas ficam bloqueadas (arquivo, função); pilhas que
+# terminam nelas são descartadas, a menos que idle=True
+IDLE_FRAMES = {
+    ("threading.py", "wait"),
+    ("threading.py", "_wait_for_tstate_lock"),
+    ("selectors.py", "select"),
+    ("socketserver.py", "serve_forever"),
+    ("socket.py", "accept"),
+    ("queue.py", "get"),
+    ("thread.py", "_worker"),
+    ("connection.py", "wait"),
+}
+
+
+class ProfilerBusy(Exception):
+    """Já existe um perfil em andamento."""
+
+
+_profile_lock = threading.Lock()
+
+
+def format_frame(frame, lines):
+    code = frame.f_code
+    line = frame.f_lineno if lines else code.co_firstlineno
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{line})"
+
+
+def is_idle(frame):
+    code = frame.f_code
+    return (os.path.basename(code.co_filename), code.co_name) in IDLE_FRAMES
+
+
+def collapse_stack(frame, lines):
+    """Pilha da raiz até o frame atual, separada por ';'."""
+    frames = []
+    while frame is not None:
+        frames.append(format_frame(frame, lines))
+        frame = frame.f_back
+    return ";".join(reversed(frames))
+
+
+def sample_stacks(seconds, rate, idle=False, lines=False):
+    """Amostra as pilhas das demais threads por `seconds` segundos.
+
+    Retorna (contagem por pilha, número de amostras). Levanta ProfilerBusy se
+    outro perfil estiver em andamento.
+    """
+    if not _profile_lock.acquire(blocking=False):
+        raise ProfilerBusy("A profile is already running")
+
+    try:
+        own_ident = threading.get_ident()
+        interval = 1.0 / rate
+        stacks = Counter()
+        samples = 0
+
+        next_tick = time.perf_counter()
+        deadline = next_tick + seconds
+        while next_tick < deadline:
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own_ident or (not idle and is_idle(frame)):
+                    continue
+                thread_name = names.get(ident, str(ident))
+                stacks[f"{thread_name};{collapse_stack(frame, lines)}"] += 1
+            samples += 1
+
+            # Taxa fixa: atrasos de uma amostra não deslocam as seguintes
+            next_tick += interval
+            delay = next_tick - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+        return stacks, samples
+    finally:
+        _profile_lock.release()
+
+
+def render_collapsed(stacks):
+    """Formato collapsed, das pilhas mais frequentes para as menos."""
+    return "".join(f"{stack} {count}\n" for stack, count in stacks.most_common())
+
+
+# ================== Heap (tracemalloc) ==================
+HEAP_DEFAULT_FRAMES = int(os.getenv("HEAP_DEFAULT_FRAMES", "1"))
+HEAP_MAX_FRAMES = int(os.getenv("HEAP_MAX_FRAMES", "25"))
+HEAP_MAX_SNAPSHOTS = int(os.getenv("HEAP_MAX_SNAPSHOTS", "4"))
+HEAP_TRACE_MAX_SECONDS = float(os.getenv("HEAP_TRACE_MAX_SECONDS", "900"))
+HEAP_GROUP_BY = ("lineno", "filename", "traceback")
+
+# Alocações do próprio tracemalloc e do import de módulos não interessam
+HEAP_FILTERS = (
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+    tracemalloc.Filter(False, "<unknown>"),
+)
+
+
+class HeapTracingInactive(Exception):
+    """O tracemalloc não está ativo."""
+
+
+class HeapTracker:
+    """Controla o tracemalloc e guarda os snapshots mais recentes."""
+
+    def __init__(self, max_snapshots=HEAP_MAX_SNAPSHOTS):
+        self.max_snapshots = max_snapshots
+        self._lock = threading.Lock()
+        self._snapshots = OrderedDict()  # id -> (snapshot, resumo)
+        self._next_id = 1
+        self._timer = None
+
+    def start(self, frames=HEAP_DEFAULT_FRAMES):
+        """Liga o tracemalloc; não faz nada se ele já estiver ativo."""
+        with self._lock:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start(frames)
+                # Desliga sozinho caso ninguém chame stop()
+                self._timer = threading.Timer(HEAP_TRACE_MAX_SECONDS, self.stop)
+                self._timer.daemon = True
+                self._timer.start()
+        return self.status()
+
+    def stop(self):
+        """Desliga o tracemalloc e descarta os snapshots."""
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            self._snapshots.clear()
+            tracemalloc.stop()
+        return self.status()
+
+    def snapshot(self):
+        """Tira um snapshot e retorna seu resumo."""
+        with self._lock:
+            if not tracemalloc.is_tracing():
+                raise HeapTracingInactive("tracemalloc is not running")
+
+            snapshot = tracemalloc.take_snapshot().filter_traces(HEAP_FILTERS)
+            stats = snapshot.statistics("filename")
+            summary = {
+                "id": self._next_id,
+                "taken_at": time.time(),
+                "size": sum(stat.size for stat in stats),
+                "count": sum(stat.count for stat in stats),
+            }
+            self._snapshots[self._next_id] = (snapshot, summary)
+            self._next_id += 1
+            while len(self._snapshots) > self.max_snapshots:
+                self._snapshots.popitem(last=False)
+            return summary
+
+    def diff(self, old_id=None, new_id=None, group_by="lineno", limit=20):
+        """Maiores diferenças de alocação entre dois snapshots.
+
+        Sem ids, compara os dois snapshots mais recentes. Levanta KeyError se
+        um snapshot não existir (ou já tiver sido descartado).
+        """
+        with self._lock:
+            ids = list(self._snapshots)
+            if old_id is None or new_id is None:
+                if len(ids) < 2:
+                    raise KeyError("At least two snapshots are required")
+                old_id, new_id = ids[-2], ids[-1]
+            old, old_summary = self._snapshots[old_id]
+            new, new_summary = self._snapshots[new_id]
+
+        stats = new.compare_to(old, group_by)
+        top = []
+        for stat in stats[:limit]:
+            frame = stat.traceback[0]
+            entry = {
+                "file": frame.filename,
+                "line": frame.lineno,
+                "size_diff": stat.size_diff,
+                "size": stat.size,
+                "count_diff": stat.count_diff,
+                "count": stat.count,
+            }
+            if group_by == "traceback":
+                entry["traceback"] = [
+                    f"{f.filename}:{f.lineno}" for f in stat.traceback
+                ]
+            top.append(entry)
+
+        return {
+            "from": old_id,
+            "to": new_id,
+            "elapsed_seconds": round(
+                new_summary["taken_at"] - old_summary["taken_at"], 3
+            ),
+            "group_by": group_by,
+            "total_size_diff": sum(stat.size_diff for stat in stats),
+            "total_count_diff": sum(stat.count_diff for stat in stats),
+            "top": top,
+        }
+
+    def status(self):
+        """Estado do tracemalloc, seu custo em memória e os snapshots guardados."""
+        with self._lock:
+            tracing = tracemalloc.is_tracing()
+            current, peak = tracemalloc.get_traced_memory() if tracing else (0, 0)
+            return {
+                "tracing": tracing,
+                "frames": tracemalloc.get_traceback_limit() if tracing else 0,
+                "traced_bytes": current,
+                "traced_peak_bytes": peak,
+                "overhead_bytes": tracemalloc.get_tracemalloc_memory(),
+                "snapshots": [summary for _, summary in self._snapshots.values()],
+            }
+
+
+heap_tracker = HeapTracker()
@@ -1,9 +1,14 @@
+import hmac
 import json
 import logging
 import os
+import sys
+import threading
 import time
 from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 from pathlib import Path
+from urllib.parse import parse_qs, urlparse
 
 import psutil
 
@@ -14,6 +19,22 @@ logging.basicConfig(
     format="[%(asctime)s] %(levelname)s - %(message)s",
 )
 
+# HTTP snapshot service (see SnapshotCollector)
+SNAPSHOT_PORT = int(os.getenv("SNAPSHOT_PORT", "9257"))
+# Loopback by default; the container sets 0.0.0.0 and compose publishes the port
+# on the host's loopback only
+SNAPSHOT_BIND = os.getenv("SNAPSHOT_BIND", "127.0.0.1")
+# /snapshot requires the X-Snapshot-Token header to match; unset disables it
+SNAPSHOT_TOKEN = os.getenv("SNAPSHOT_TOKEN", "")
+SNAPSHOT_DEFAULT_TOP = 10
+SNAPSHOT_MAX_TOP = 50
+# CPU percentages are measured over this window when no recent sample exists
+SNAPSHOT_CPU_INTERVAL = float(os.getenv("SNAPSHOT_CPU_INTERVAL", "0.5"))
+SNAPSHOT_MAX_SAMPLE_AGE = 10.0
+SNAPSHOT_CMDLINE_CHARS = 120
+
+MB = 1024 * 1024
+
 
 class PythonServiceMonitor:
     def __init__(self, service_name="user_service", monitor_interval=60):
@@ -114,6 +135,214 @@ class PythonServiceMonitor:
             logging.error(f"Monitoring error: {e}")
 
 
+def _safe(call, default=None):
+    """Return call(), or default when psutil is denied access to the value."""
+    try:
+        return call()
+    except (psutil.AccessDenied, psutil.ZombieProcess, NotImplementedError):
+        return default
+
+
+class SnapshotCollector:
+    """Compact JSON view of the container: load, memory and top processes.
+
+    psutil measures CPU percent as the usage since the previous call on the
+    same Process object, so the collector keeps those objects between
+    snapshots. When the previous sample is older than SNAPSHOT_MAX_SAMPLE_AGE
+    seconds, a fresh one is taken and the snapshot waits SNAPSHOT_CPU_INTERVAL.
+    """
+
+    def __init__(self, service_name="user_service"):
+        self.service_name = service_name
+        self._lock = threading.Lock()
+        self._procs = {}
+        self._last_sample = 0.0
+
+    def _refresh(self):
+        """Update the cached Process objects and return them."""
+        current = {}
+        for proc in psutil.process_iter():
+            cached = self._procs.get(proc.pid)
+            # Same pid but a different process (pid reused)
+            if cached is not None and cached.is_running():
+                current[proc.pid] = cached
+            else:
+                current[proc.pid] = proc
+        self._procs = current
+        return list(current.values())
+
+    def _sample_cpu(self):
+        procs = self._refresh()
+        if time.monotonic() - self._last_sample > SNAPSHOT_MAX_SAMPLE_AGE:
+            psutil.cpu_percent(interval=None)
+            for proc in procs:
+                _safe(lambda: proc.cpu_percent(interval=None))
+            time.sleep(SNAPSHOT_CPU_INTERVAL)
+        self._last_sample = time.monotonic()
+        return procs
+
+    def _process_row(self, proc):
+        with proc.oneshot():
+            memory = proc.memory_info()
+            cmdline = " ".join(_safe(proc.cmdline, []) or [proc.name()])
+            return {
+                "pid": proc.pid,
+                "ppid": _safe(proc.ppid),
+                "name": proc.name(),
+                "user": _safe(proc.username),
+                "status": proc.status(),
+                "cpu_percent": round(proc.cpu_percent(interval=None), 1),
+                "memory_percent": round(proc.memory_percent(), 1),
+                "rss_mb": round(memory.rss / MB, 1),
+                "threads": proc.num_threads(),
+                "fds": _safe(proc.num_fds),
+                "started": datetime.fromtimestamp(proc.create_time()).isoformat(
+                    timespec="seconds"
+                ),
+                "cmdline": cmdline[:SNAPSHOT_CMDLINE_CHARS],
+            }
+
+    def _service_details(self, rows):
+        """Extra details for the monitored service process, if it is running."""
+        row = next(
+            (
+                r
+                for r in rows
+                if r["name"].startswith("python") and self.service_name in r["cmdline"]
+            ),
+            None,
+        )
+        if row is None:
+            return None
+
+        details = dict(row)
+        proc = self._procs.get(row["pid"])
+        connections = _safe(
+            lambda: getattr(proc, "net_connections", proc.connections)(kind="inet"),
+            [],
+        )
+        states = {}
+        for connection in connections or []:
+            states[connection.status] = states.get(connection.status, 0) + 1
+        details["connections"] = states
+        details["open_files"] = len(_safe(proc.open_files, []) or [])
+        details["uptime_seconds"] = round(time.time() - proc.create_time())
+        return details
+
+    def snapshot(self, top=SNAPSHOT_DEFAULT_TOP, sort="cpu"):
+        """Collect the snapshot; sort is "cpu" or "rss"."""
+        top = max(1, min(int(top), SNAPSHOT_MAX_TOP))
+        sort_key = "rss_mb" if sort == "rss" else "cpu_percent"
+
+        with self._lock:
+            start = time.perf_counter()
+            procs = self._sample_cpu()
+            cpu_percent = psutil.cpu_percent(interval=None)
+            rows = []
+            for proc in procs:
+                try:
+                    rows.append(self._process_row(proc))
+                except (psutil.NoSuchProcess, psutil.AccessDenied):
+                    continue
+            service = self._service_details(rows)
+
+        memory = psutil.virtual_memory()
+        swap = psutil.swap_memory()
+        load1, load5, load15 = os.getloadavg()
+        statuses = {}
+        for row in rows:
+            statuses[row["status"]] = statuses.get(row["status"], 0) + 1
+        rows.sort(key=lambda r: r[sort_key], reverse=True)
+
+        return {
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "system": {
+                "cpu_count": psutil.cpu_count(),
+                "cpu_percent": cpu_percent,
+                "load_average": [round(load1, 2), round(load5, 2), round(load15, 2)],
+                "memory": {
+                    "total_mb": round(memory.total / MB),
+                    "available_mb": round(memory.available / MB),
+                    "used_percent": memory.percent,
+                },
+                "swap": {
+                    "total_mb": round(swap.total / MB),
+                    "used_percent": swap.percent,
+                },
+                "processes": len(rows),
+                "process_status": statuses,
+            },
+            "service": service,
+            "top_processes": {"sort": sort_key, "rows": rows[:top]},
+            "collect_ms": round((time.perf_counter() - start) * 1000, 1),
+        }
+
+
+class SnapshotHandler(BaseHTTPRequestHandler):
+    """GET /snapshot?top=10&sort=cpu|rss and GET /health."""
+
+    collector = None
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path == "/health":
+            return self._send(200, {"status": "ok"})
+        if url.path != "/snapshot":
+            return self._send(404, {"error": "Not found"})
+        if not SNAPSHOT_TOKEN:
+            return self._send(404, {"error": "Snapshot endpoint is disabled"})
+        provided = self.headers.get("X-Snapshot-Token", "")
+        if not hmac.compare_digest(provided.encode(), SNAPSHOT_TOKEN.encode()):
+            return self._send(403, {"error": "Invalid snapshot token"})
+
+        query = parse_qs(url.query)
+        sort = query.get("sort", ["cpu"])[0]
+        if sort not in ("cpu", "rss"):
+            return self._send(400, {"error": "sort must be cpu or rss"})
+        try:
+            top = int(query.get("top", [SNAPSHOT_DEFAULT_TOP])[0])
+        except ValueError:
+            return self._send(400, {"error": "top must be an integer"})
+
+        try:
+            self._send(200, self.collector.snapshot(top=top, sort=sort))
+        except Exception as e:
+            logging.error(f"Error collecting snapshot: {e}")
+            self._send(500, {"error": str(e)})
+
+    def _send(self, status, document):
+        body = json.dumps(document).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        logging.info(f"{self.address_string()} - {format % args}")
+
+
+def serve_snapshots(
+    port=SNAPSHOT_PORT, bind=SNAPSHOT_BIND, service_name="user_service"
+):
+    """Serve snapshots over HTTP until interrupted."""
+    if not SNAPSHOT_TOKEN:
+        logging.warning("SNAPSHOT_TOKEN is not set; /snapshot is disabled")
+    SnapshotHandler.collector = SnapshotCollector(service_name)
+    server = ThreadingHTTPServer((bind, port), SnapshotHandler)
+    server.daemon_threads = True
+    logging.info(f"Serving process snapshots on {bind}:{port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        logging.info("Snapshot service stopped by user")
+    finally:
+        server.server_close()
+
+
 if __name__ == "__main__":
-    monitor = PythonServiceMonitor()
-    monitor.monitor_continuously()
+    if len(sys.argv) > 1 and sys.argv[1] == "serve":
+        serve_snapshots()
+    else:
+        monitor = PythonServiceMonitor()
+        monitor.monitor_continuously()
@@ -0,0 +1,14 @@
+"""Ponto de entrada do user-service: python3 serve.py [bootstrap].
+
+O pool de hash de senhas usa forkserver, e cada worker reimporta o script
+principal como __mp_main__. Por isso o script principal é este módulo, que não
+faz nada ao ser importado: user_service (Flask, SQLAlchemy, logs, métricas) só
+é carregado no processo do servidor.
+"""
+
+import sys
+
+if __name__ == "__main__":
+    import user_service
+
+    user_service.main(sys.argv[1:])
@@ -0,0 +1,10 @@
+import os
+import sys
+import tempfile
+
+# user_service lê a configuração na importação: métricas multiprocesso em um
+# diretório temporário e SQLite no lugar do Postgres (conectado só no uso)
+os.environ.setdefault("PROMETHEUS_MULTIPROC_DIR", tempfile.mkdtemp(prefix="prom-"))
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,131 @@
+import os
+import shutil
+import subprocess
+import sys
+import textwrap
+
+import pytest
+from prometheus_client import CollectorRegistry
+from prometheus_client.multiprocess import MultiProcessCollector
+
+import user_service
+
+# Processo filho que grava métricas no diretório multiprocesso e encerra
+WRITER = textwrap.dedent("""
+    import sys
+    from prometheus_client import Counter, Gauge, Histogram
+
+    value = float(sys.argv[1])
+    Counter("jobs", "Jobs", ["kind"]).labels("a").inc(value)
+    latency = Histogram("latency", "Latency", buckets=(0.1, 1))
+    latency.observe(0.05)
+    latency.observe(value)
+    Gauge("peak", "Peak", multiprocess_mode="max").set(value)
+    Gauge("busy", "Busy", multiprocess_mode="livesum").set(1)
+    """)
+
+
+def spawn_metrics(path, value):
+    """Grava métricas em um processo já encerrado; retorna o pid dele."""
+    env = dict(os.environ, PROMETHEUS_MULTIPROC_DIR=str(path))
+    process = subprocess.Popen([sys.executable, "-c", WRITER, str(value)], env=env)
+    assert process.wait() == 0
+    return process.pid
+
+
+def collect(path):
+    """{(amostra, labels): valor} como exposto pelo /metrics."""
+    registry = CollectorRegistry()
+    MultiProcessCollector(registry, path=str(path))
+    return {
+        (sample.name, tuple(sorted(sample.labels.items()))): sample.value
+        for metric in registry.collect()
+        for sample in metric.samples
+    }
+
+
+def without_livesum(samples):
+    return {key: value for key, value in samples.items() if key[0] != "busy"}
+
+
+@pytest.fixture
+def dead_pid():
+    process = subprocess.Popen([sys.executable, "-c", "pass"])
+    process.wait()
+    return process.pid
+
+
+def test_parse_metrics_file():
+    assert user_service.parse_metrics_file("counter_123.db") == ("counter", None, 123)
+    assert user_service.parse_metrics_file("gauge_livesum_45.db") == (
+        "gauge",
+        "livesum",
+        45,
+    )
+    assert user_service.parse_metrics_file("histogram_aggregate.db") == (
+        "histogram",
+        None,
+        None,
+    )
+    assert user_service.parse_metrics_file("gauge_max_aggregate.db") == (
+        "gauge",
+        "max",
+        None,
+    )
+
+
+def test_is_process_alive(dead_pid):
+    assert user_service.is_process_alive(os.getpid())
+    assert not user_service.is_process_alive(dead_pid)
+
+
+def test_compaction_keeps_exposed_values(tmp_path):
+    spawn_metrics(tmp_path, 2)
+    spawn_metrics(tmp_path, 3)
+    before = collect(tmp_path)
+
+    removed = user_service.compact_metrics_files(str(tmp_path))
+
+    files = sorted(p.name for p in tmp_path.glob("*.db"))
+    assert removed == 8
+    assert files == [
+        "counter_aggregate.db",
+        "gauge_max_aggregate.db",
+        "histogram_aggregate.db",
+    ]
+    after = collect(tmp_path)
+    # Gauges livesum de processos mortos são descartados; o resto é mantido,
+    # inclusive os buckets dos histogramas
+    assert ("busy", ()) not in after
+    assert after == without_livesum(before)
+    assert after[("jobs_total", (("kind", "a"),))] == 5
+    assert after[("peak", ())] == 3
+    assert after[("latency_bucket", (("le", "0.1"),))] == 2
+    assert after[("latency_bucket", (("le", "+Inf"),))] == 4
+
+
+def test_compaction_merges_into_existing_aggregate(tmp_path):
+    spawn_metrics(tmp_path, 2)
+    user_service.compact_metrics_files(str(tmp_path))
+    spawn_metrics(tmp_path, 4)
+    before = without_livesum(collect(tmp_path))
+
+    user_service.compact_metrics_files(str(tmp_path))
+
+    after = collect(tmp_path)
+    assert after == before
+    assert after[("jobs_total", (("kind", "a"),))] == 6
+    assert after[("peak", ())] == 4
+    assert after[("latency_count", ())] == 4
+
+
+def test_compaction_keeps_files_of_live_processes(tmp_path):
+    pid = spawn_metrics(tmp_path, 2)
+    live = tmp_path / f"counter_{os.getpid()}.db"
+    shutil.copy(tmp_path / f"counter_{pid}.db", live)
+
+    user_service.compact_metrics_files(str(tmp_path))
+
+    assert live.exists()
+    assert not (tmp_path / f"counter_{pid}.db").exists()
+    assert collect(tmp_path)[("jobs_total", (("kind", "a"),))] == 4
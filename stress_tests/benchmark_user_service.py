@@ -0,0 +1,451 @@
+"""
+Benchmark offline dos endpoints do user-service.
+
+Executa user_service.app em processo, sem o docker-compose: SQLite em um
+diretório temporário, Redis falso (fakeredis) e conexão pika substituída por um
+stub. Mede vazão, percentis de latência e alocações por endpoint e gera um
+relatório JSON, que pode ser comparado com um relatório de referência para
+barrar regressões de desempenho.
+
+Uso:
+    pip install -r stress_tests/requirements-benchmark.txt
+    python stress_tests/benchmark_user_service.py --output report.json
+    python stress_tests/benchmark_user_service.py --baseline report.json
+"""
+
+import argparse
+import importlib.util
+import json
+import logging
+import os
+import platform
+import random
+import statistics
+import string
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+
+logging.basicConfig(
+    level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+)
+logger = logging.getLogger("benchmark")
+
+USER_SERVICE_DIR = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "..", "services", "user-service"
+)
+
+
+# ================== Stubs das dependências externas ==================
+class StubChannel:
+    """Canal pika que apenas conta as mensagens publicadas."""
+
+    def __init__(self, connection):
+        self.connection = connection
+        self.is_open = True
+
+    def queue_declare(self, *args, **kwargs):
+        pass
+
+    def basic_publish(self, *args, **kwargs):
+        with self.connection.lock:
+            self.connection.published += 1
+
+    def close(self):
+        self.is_open = False
+
+
+class StubBlockingConnection:
+    """Substitui pika.BlockingConnection sem abrir conexões de rede."""
+
+    instances = []
+
+    def __init__(self, *args, **kwargs):
+        self.is_open = True
+        self.published = 0
+        self.lock = threading.Lock()
+        StubBlockingConnection.instances.append(self)
+
+    def channel(self):
+        return StubChannel(self)
+
+    def close(self):
+        self.is_open = False
+
+
+def load_service(workdir, hash_iterations):
+    """Configura o ambiente e importa o user_service com os stubs."""
+    import fakeredis
+    import pika
+    import redis
+
+    metrics_dir = os.path.join(workdir, "prometheus")
+    os.makedirs(metrics_dir, exist_ok=True)
+    os.environ["PROMETHEUS_MULTIPROC_DIR"] = metrics_dir
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+    # O import configura os logs; fora do container /var/log/app e /app
+    # normalmente não podem ser escritos
+    os.environ["LOG_DIR"] = os.environ["APP_LOG_DIR"] = os.path.join(workdir, "logs")
+    if hash_iterations:
+        os.environ["PASSWORD_HASH_ITERATIONS"] = str(hash_iterations)
+
+    fake_redis = fakeredis.FakeRedis()
+    redis.Redis.from_url = classmethod(lambda cls, *args, **kwargs: fake_redis)
+    pika.BlockingConnection = StubBlockingConnection
+
+    sys.path.insert(0, os.path.abspath(USER_SERVICE_DIR))
+    import user_service
+
+    # Logs em arquivo e por requisição distorcem a medição: mantém só os avisos
+    for service_logger in (user_service.logger, user_service.access_logger):
+        for handler in list(service_logger.handlers):
+            if isinstance(handler, logging.FileHandler):
+                service_logger.removeHandler(handler)
+        service_logger.setLevel(logging.WARNING)
+
+    with user_service.app.app_context():
+        user_service.bootstrap_database()
+    return user_service
+
+
+# ================== Cenários ==================
+def random_string(length):
+    letters = string.ascii_letters + string.digits
+    return "".join(random.choice(letters) for _ in range(length))
+
+
+def random_profile():
+    return {
+        "first_name": random_string(8),
+        "last_name": random_string(8),
+        "bio": random_string(500),
+    }
+
+
+class Fixture:
+    """Usuários e tokens criados antes das medições.
+
+    Os usuários são divididos em três grupos para que um cenário não interfira
+    nos outros: logins repetidos expulsam sessões antigas (limite de sessões
+    por usuário) e atualizações de perfil invalidam o ETag.
+    """
+
+    def __init__(self, client, users):
+        self.login_users = []
+        self.reader_tokens = []
+        self.writer_tokens = []
+        self.etags = {}
+        for index in range(users):
+            username = f"bench_{random_string(10)}"
+            client.post(
+                "/register",
+                json={
+                    "username": username,
+                    "password": "password123",
+                    "email": f"{username}@example.com",
+                    "profile": random_profile(),
+                },
+            )
+            if index % 3 == 0:
+                self.login_users.append(username)
+                continue
+
+            response = client.post(
+                "/login", json={"username": username, "password": "password123"}
+            )
+            token = response.get_json()["access_token"]
+            if index % 3 == 1:
+                self.reader_tokens.append(token)
+                etag = client.get("/profile", headers=self.auth(token)).headers.get(
+                    "ETag"
+                )
+                self.etags[token] = etag
+            else:
+                self.writer_tokens.append(token)
+        self.user_count = users
+
+    @staticmethod
+    def auth(token):
+        return {"Authorization": f"Bearer {token}"}
+
+
+def scenario_register(client, fixture):
+    username = f"bench_{random_string(12)}"
+    return client.post(
+        "/register",
+        json={
+            "username": username,
+            "password": "password123",
+            "email": f"{username}@example.com",
+            "profile": random_profile(),
+        },
+    )
+
+
+def scenario_login(client, fixture):
+    username = random.choice(fixture.login_users)
+    return client.post("/login", json={"username": username, "password": "password123"})
+
+
+def scenario_profile_get(client, fixture):
+    token = random.choice(fixture.reader_tokens)
+    return client.get("/profile", headers=fixture.auth(token))
+
+
+def scenario_profile_conditional(client, fixture):
+    token = random.choice(fixture.reader_tokens)
+    headers = fixture.auth(token)
+    headers["If-None-Match"] = fixture.etags[token] or ""
+    return client.get("/profile", headers=headers)
+
+
+def scenario_profile_put(client, fixture):
+    token = random.choice(fixture.writer_tokens)
+    return client.put(
+        "/profile", headers=fixture.auth(token), json={"bio": random_string(500)}
+    )
+
+
+def scenario_users_page(client, fixture):
+    return client.get(
+        "/users",
+        query_string={"page": random.randint(1, 3), "per_page": 100},
+        headers={"Accept-Encoding": "gzip"},
+    )
+
+
+def scenario_users_batch(client, fixture):
+    ids = ",".join(str(random.randint(1, fixture.user_count)) for _ in range(20))
+    return client.get("/users/batch", query_string={"ids": ids})
+
+
+def scenario_health(client, fixture):
+    return client.get("/health")
+
+
+def scenario_metrics(client, fixture):
+    return client.get("/metrics")
+
+
+SCENARIOS = {
+    "register": scenario_register,
+    "login": scenario_login,
+    "profile_get": scenario_profile_get,
+    "profile_get_304": scenario_profile_conditional,
+    "profile_put": scenario_profile_put,
+    "users_page": scenario_users_page,
+    "users_batch": scenario_users_batch,
+    "health": scenario_health,
+    "metrics": scenario_metrics,
+}
+
+
+# ================== Medição ==================
+def percentile(sorted_values, fraction):
+    """Percentil por interpolação linear sobre valores ordenados."""
+    if not sorted_values:
+        return 0.0
+    position = (len(sorted_values) - 1) * fraction
+    lower = int(position)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    weight = position - lower
+    return sorted_values[lower] * (1 - weight) + sorted_values[upper] * weight
+
+
+def run_scenario(app, fixture, name, func, requests_count, threads, allocations):
+    """Executa um cenário e retorna suas estatísticas."""
+    latencies = []
+    statuses = {}
+    lock = threading.Lock()
+    per_thread = max(1, requests_count // threads)
+
+    def worker():
+        client = app.test_client()
+        local_latencies = []
+        local_statuses = {}
+        for _ in range(per_thread):
+            start = time.perf_counter()
+            response = func(client, fixture)
+            local_latencies.append(time.perf_counter() - start)
+            local_statuses[response.status_code] = (
+                local_statuses.get(response.status_code, 0) + 1
+            )
+        with lock:
+            latencies.extend(local_latencies)
+            for status, count in local_statuses.items():
+                statuses[status] = statuses.get(status, 0) + count
+
+    if allocations:
+        tracemalloc.start()
+        tracemalloc.reset_peak()
+        memory_before = tracemalloc.get_traced_memory()[0]
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        for future in [executor.submit(worker) for _ in range(threads)]:
+            future.result()
+    elapsed = time.perf_counter() - started
+
+    result = {
+        "requests": len(latencies),
+        "threads": threads,
+        "elapsed_seconds": round(elapsed, 4),
+        "throughput_rps": round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+        "status_codes": {str(k): v for k, v in sorted(statuses.items())},
+    }
+
+    latencies.sort()
+    result["latency_ms"] = {
+        "mean": round(statistics.fmean(latencies) * 1000, 3),
+        "p50": round(percentile(latencies, 0.50) * 1000, 3),
+        "p90": round(percentile(latencies, 0.90) * 1000, 3),
+        "p99": round(percentile(latencies, 0.99) * 1000, 3),
+        "max": round(latencies[-1] * 1000, 3),
+    }
+
+    if allocations:
+        memory_after, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        result["allocations"] = {
+            "peak_bytes": peak - memory_before,
+            "retained_bytes": memory_after - memory_before,
+            "peak_bytes_per_request": round((peak - memory_before) / len(latencies)),
+        }
+
+    logger.info(
+        f"{name}: {result['throughput_rps']} req/s, "
+        f"p50={result['latency_ms']['p50']}ms p99={result['latency_ms']['p99']}ms"
+    )
+    return result
+
+
+def compare_with_baseline(report, baseline, max_regression):
+    """Lista as regressões acima do limite em relação ao relatório de referência."""
+    regressions = []
+    for name, current in report["scenarios"].items():
+        previous = baseline.get("scenarios", {}).get(name)
+        if not previous:
+            continue
+
+        old_p50 = previous["latency_ms"]["p50"]
+        new_p50 = current["latency_ms"]["p50"]
+        if old_p50 and (new_p50 - old_p50) / old_p50 > max_regression:
+            regressions.append(f"{name}: p50 {old_p50}ms -> {new_p50}ms")
+
+        old_rps = previous["throughput_rps"]
+        new_rps = current["throughput_rps"]
+        if old_rps and (old_rps - new_rps) / old_rps > max_regression:
+            regressions.append(f"{name}: throughput {old_rps} -> {new_rps} req/s")
+    return regressions
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--requests", type=int, default=500, help="por cenário")
+    parser.add_argument("--threads", type=int, default=4)
+    parser.add_argument(
+        "--users", type=int, default=60, help="usuários pré-criados (mínimo 3)"
+    )
+    parser.add_argument(
+        "--scenarios",
+        default=",".join(SCENARIOS),
+        help="lista separada por vírgulas",
+    )
+    parser.add_argument(
+        "--hash-iterations",
+        type=int,
+        default=None,
+        help="sobrescreve PASSWORD_HASH_ITERATIONS",
+    )
+    parser.add_argument(
+        "--allocations", action="store_true", help="mede alocações (tracemalloc)"
+    )
+    parser.add_argument("--output", help="arquivo do relatório JSON (padrão: stdout)")
+    parser.add_argument("--baseline", help="relatório de referência para comparação")
+    parser.add_argument(
+        "--max-regression",
+        type=float,
+        default=0.2,
+        help="regressão relativa tolerada em p50 e vazão (padrão 0.2)",
+    )
+    parser.add_argument("--seed", type=int, default=42)
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    random.seed(args.seed)
+
+    selected = [name.strip() for name in args.scenarios.split(",") if name.strip()]
+    unknown = [name for name in selected if name not in SCENARIOS]
+    if unknown:
+        logger.error(f"Unknown scenarios: {unknown}")
+        sys.exit(2)
+
+    if args.users < 3:
+        logger.error("--users must be at least 3")
+        sys.exit(2)
+
+    if importlib.util.find_spec("fakeredis") is None:
+        logger.error(
+            "fakeredis not installed: pip install -r requirements-benchmark.txt"
+        )
+        sys.exit(2)
+
+    with tempfile.TemporaryDirectory(prefix="user-service-bench-") as workdir:
+        user_service = load_service(workdir, args.hash_iterations)
+        app = user_service.app
+
+        logger.info(f"Creating {args.users} users...")
+        fixture = Fixture(app.test_client(), args.users)
+
+        report = {
+            "generated_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "config": {
+                "requests": args.requests,
+                "threads": args.threads,
+                "users": args.users,
+                "hash_iterations": args.hash_iterations,
+            },
+            "scenarios": {},
+        }
+        for name in selected:
+            report["scenarios"][name] = run_scenario(
+                app,
+                fixture,
+                name,
+                SCENARIOS[name],
+                args.requests,
+                args.threads,
+                args.allocations,
+            )
+        report["events_published"] = sum(
+            connection.published for connection in StubBlockingConnection.instances
+        )
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+        logger.info(f"Report written to {args.output}")
+    else:
+        print(output)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare_with_baseline(report, baseline, args.max_regression)
+        if regressions:
+            for regression in regressions:
+                logger.error(f"Regression: {regression}")
+            sys.exit(1)
+        logger.info("No regressions above threshold")
+
+
+if __name__ == "__main__":
+    main()